@@ -0,0 +1,123 @@
+# Generates synthetic stock / esg_history / pricing_history CSV files at a configurable scale.
+# The files have the same layout as the ones written by dashboard/fetch_data.py, so they can be
+# loaded with data/loader.py and queried by the dashboard pages.
+#
+# Usage: python generate_data.py --tickers 5000 --years 10 --output-dir synthetic
+import argparse
+import os
+import string
+
+import numpy as np
+import pandas as pd
+
+INDUSTRIES = [
+    'Aerospace & Defense', 'Airlines', 'Automobiles', 'Banking', 'Beverages', 'Biotechnology',
+    'Chemicals', 'Commercial Services & Supplies', 'Construction', 'Consumer products',
+    'Diversified Consumer Services', 'Electrical Equipment', 'Energy', 'Financial Services',
+    'Food Products', 'Health Care', 'Hotels, Restaurants & Leisure', 'Insurance', 'Machinery',
+    'Media', 'Metals & Mining', 'Pharmaceuticals', 'Real Estate', 'Retail', 'Road & Rail',
+    'Semiconductors', 'Technology', 'Telecommunication', 'Textiles, Apparel & Luxury Goods', 'Utilities',
+]
+COUNTRIES = ['US', 'US', 'US', 'US', 'GB', 'NL', 'DE', 'CA', 'CH', 'JP']
+
+# Number of tickers whose price history is generated (and written) at once
+TICKERS_PER_CHUNK = 250
+
+# Function to create unique, letters-only ticker symbols (A, B, ..., AA, AB, ...)
+def make_ticker_symbols(count):
+    letters = string.ascii_uppercase
+    symbols = []
+    for i in range(count):
+        symbol = ''
+        i += 1
+        while i > 0:
+            i, remainder = divmod(i - 1, 26)
+            symbol = letters[remainder] + symbol
+        symbols.append(symbol)
+    return symbols
+
+# Function to generate the stock table
+def generate_stocks(tickers, rng):
+    industries = rng.choice(INDUSTRIES, size=len(tickers))
+    return pd.DataFrame({
+        'ticker_symbol': tickers,
+        'name': [f'{ticker} Synthetic Corp' for ticker in tickers],
+        'industry': industries,
+        # Market cap in millions, like the Finnhub profile
+        'market_cap': np.round(rng.lognormal(mean=9, sigma=1.8, size=len(tickers)), 4),
+        'country': rng.choice(COUNTRIES, size=len(tickers)),
+        'description': [f'{ticker} Synthetic Corp operates in the {industry} industry. It is generated for benchmarking.'
+                        for ticker, industry in zip(tickers, industries)],
+        'logo': [f'https://example.com/logo/{ticker}.png' for ticker in tickers],
+        'updated_at': pd.Timestamp.now(),
+    })
+
+# Function to generate one ESG rating per ticker, in the same score ranges as the Kaggle data set
+def generate_esg_history(tickers, rng, end_date):
+    environment = rng.integers(200, 720, size=len(tickers))
+    social = rng.integers(160, 560, size=len(tickers))
+    governance = rng.integers(75, 475, size=len(tickers))
+    dates = end_date - pd.to_timedelta(rng.integers(0, 365, size=len(tickers)), unit='D')
+    return pd.DataFrame({
+        'ticker_symbol': tickers,
+        'date': dates.strftime('%Y-%m-%d'),
+        'total_score': environment + social + governance,
+        'environment_score': environment,
+        'social_score': social,
+        'governance_score': governance,
+    })
+
+# Function to generate daily OHLC bars for a chunk of tickers as geometric random walks
+def generate_pricing_chunk(tickers, dates, rng):
+    n_days = len(dates)
+    start_price = rng.lognormal(mean=3.5, sigma=1.0, size=(len(tickers), 1))
+    log_returns = rng.normal(loc=0.0003, scale=0.02, size=(len(tickers), n_days))
+    close = start_price * np.exp(np.cumsum(log_returns, axis=1))
+    open_ = close * np.exp(rng.normal(0, 0.01, size=close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, size=close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, size=close.shape)))
+    return pd.DataFrame({
+        'ticker_symbol': np.repeat(tickers, n_days),
+        'date': np.tile(dates.strftime('%Y-%m-%d'), len(tickers)),
+        'open': open_.ravel().round(4),
+        'high': high.ravel().round(4),
+        'low': low.ravel().round(4),
+        'close': close.ravel().round(4),
+    })
+
+# Writes all three CSV files and returns the number of rows per table
+def generate_dataset(output_dir, n_tickers=1000, years=1, seed=13, end_date='2024-10-31'):
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    end_date = pd.Timestamp(end_date)
+    tickers = make_ticker_symbols(n_tickers)
+    dates = pd.bdate_range(end=end_date, periods=years * 252)
+
+    stocks = generate_stocks(tickers, rng)
+    stocks.to_csv(os.path.join(output_dir, 'stock.csv'), index=False)
+    generate_esg_history(tickers, rng, end_date).to_csv(os.path.join(output_dir, 'esg_history.csv'), index=True)
+
+    # Pricing history is written in chunks so memory stays bounded at large scales
+    pricing_path = os.path.join(output_dir, 'pricing_history.csv')
+    row_offset = 0
+    for start in range(0, n_tickers, TICKERS_PER_CHUNK):
+        chunk = generate_pricing_chunk(tickers[start:start + TICKERS_PER_CHUNK], dates, rng)
+        chunk.index += row_offset
+        chunk.to_csv(pricing_path, mode='w' if start == 0 else 'a', header=start == 0, index=True)
+        row_offset += len(chunk)
+
+    return {'stock': n_tickers, 'esg_history': n_tickers, 'pricing_history': row_offset}
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic ESG dashboard data')
+    parser.add_argument('--tickers', type=int, default=1000, help='Number of tickers (1k-50k)')
+    parser.add_argument('--years', type=int, default=1, help='Years of daily bars per ticker (1-30)')
+    parser.add_argument('--seed', type=int, default=13)
+    parser.add_argument('--output-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synthetic'))
+    args = parser.parse_args()
+
+    row_counts = generate_dataset(args.output_dir, args.tickers, args.years, args.seed)
+    print(f"Generated {row_counts} in {args.output_dir}")
+
+if __name__ == '__main__':
+    main()
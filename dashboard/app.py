@@ -1,19 +1,32 @@
 import streamlit as st
 
 from news import render_news_sidebar
+from utils import profiling
+from utils.warmup import start_cache_warmer
 
 # Define the pages
 pg = st.navigation([
     st.Page("home.py", title="Home", icon="🏡"), 
     st.Page("esg.py", title="ESG and Market Performance", icon="📊"),
     st.Page("pricing.py", title="Stocks Analysis", icon="💹"),
+    st.Page("screener.py", title="Stock Screener", icon="🔎"),
+    st.Page("backtest.py", title="ESG Strategy Backtest", icon="🧪"),
 ])
 
 # Set the page configuration (this should be the first Streamlit command)
 st.set_page_config(page_title="ESG Dashboard", page_icon=":bar_chart:", layout='wide', initial_sidebar_state='expanded')
 
-# Run the page navigation
-pg.run()
+# Run the page navigation (instrumented when profiling is enabled, see utils/profiling.py)
+with profiling.page_run(pg.title):
+    pg.run()
 
-# render news sidebar 
-render_news_sidebar()
\ No newline at end of file
+    # render news sidebar 
+    with profiling.span("section", "news_sidebar"):
+        render_news_sidebar()
+
+# Performance debug panel, only shown when profiling is enabled
+profiling.render_debug_panel()
+
+# Pre-warm the cached dashboard data in the background and keep it fresh (see utils/warmup.py).
+# Started after the first page has rendered, so the warm-up doesn't slow down the cold start
+start_cache_warmer()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import plotly.express as px
+import streamlit as st
+
+from utils import data, profiling
+from utils.backtest import DEFAULT_PARAMETERS, REBALANCE_FREQUENCIES, SCORE_LABELS, STRATEGY_LABELS, WEIGHTING_LABELS, parameter_grid
+
+# Page Title and Description
+st.title("ESG Strategy Backtest")
+st.markdown("""
+Check whether an ESG tilt would have paid off historically. The strategy is rebalanced periodically into the **best ESG-scored companies**,
+or into every company except the **ESG laggards**, and compared with an equal-weight portfolio of all companies rebalanced on the same dates.
+Every rebalance pays the transaction cost on the traded value. Scores are taken as of every rebalance date, so a company can only be selected once its first score is published; before any score is published the strategy holds cash.
+""")
+
+# Labels of the backtest metrics, and whether they are shown as percentages
+METRIC_LABELS = {
+    'total_return': 'Total Return',
+    'annualized_return': 'Annualized Return',
+    'annualized_volatility': 'Annualized Volatility',
+    'sharpe_ratio': 'Sharpe Ratio',
+    'max_drawdown': 'Max Drawdown',
+    'tracking_error': 'Tracking Error',
+    'information_ratio': 'Information Ratio',
+    'annual_turnover': 'Annual Turnover',
+    'total_costs': 'Total Costs',
+    'average_holdings': 'Average Holdings',
+}
+PERCENT_METRICS = ['total_return', 'annualized_return', 'annualized_volatility', 'max_drawdown', 'tracking_error', 'annual_turnover', 'total_costs']
+PORTFOLIO_LABELS = {'strategy': 'ESG Strategy', 'benchmark': 'Equal-weight Benchmark'}
+
+# Sidebar settings
+st.sidebar.header("Backtest Settings")
+strategy = st.sidebar.radio('Strategy:', list(STRATEGY_LABELS), format_func=STRATEGY_LABELS.get)
+score = st.sidebar.selectbox('Score:', list(SCORE_LABELS), format_func=SCORE_LABELS.get)
+fraction_label = 'Share of companies held (%)' if strategy == 'top_esg' else 'Share of companies excluded (%)'
+fraction = st.sidebar.slider(fraction_label, min_value=5, max_value=50, value=int(DEFAULT_PARAMETERS['fraction'] * 100), step=5) / 100
+frequency = st.sidebar.radio('Rebalancing:', list(REBALANCE_FREQUENCIES), horizontal=True)
+weighting = st.sidebar.radio('Weighting:', list(WEIGHTING_LABELS), format_func=WEIGHTING_LABELS.get, horizontal=True)
+industry_neutral = st.sidebar.checkbox('Select within every industry', value=DEFAULT_PARAMETERS['industry_neutral'])
+cost_bps = st.sidebar.number_input('Transaction cost (basis points):', min_value=0.0, max_value=100.0, value=DEFAULT_PARAMETERS['cost_bps'], step=5.0)
+
+parameters = {
+    'strategy': strategy, 'score': score, 'fraction': fraction, 'frequency': frequency,
+    'cost_bps': cost_bps, 'weighting': weighting, 'industry_neutral': industry_neutral,
+}
+result = data.load_backtest(**parameters)
+if len(result['equity']) < 2:
+    st.warning("The price history needs at least two trading days to backtest a strategy.")
+    st.stop()
+profiling.record_frame("backtest_equity", result['equity'])
+
+# Metrics of the strategy and the benchmark
+st.subheader("Performance", divider=True)
+metrics = result['metrics'].copy()
+metrics[PERCENT_METRICS] = metrics[PERCENT_METRICS] * 100
+metrics = metrics.rename(index=PORTFOLIO_LABELS, columns={column: f"{label} (%)" if column in PERCENT_METRICS else label for column, label in METRIC_LABELS.items()})
+st.dataframe(metrics.T.round(2), width="stretch")
+
+with profiling.span("chart", "backtest_equity_curves"):
+    equity = result['equity'].rename(columns=PORTFOLIO_LABELS).reset_index().melt(id_vars='date', var_name='portfolio', value_name='value')
+    equity_fig = px.line(
+        equity, x='date', y='value', color='portfolio',
+        labels={'date': 'Date', 'value': 'Value of 1 invested', 'portfolio': 'Portfolio'},
+        title=f"{STRATEGY_LABELS[strategy]} ({SCORE_LABELS[score]}) vs Equal-weight Benchmark",
+    )
+    st.plotly_chart(equity_fig, width="stretch")
+
+with profiling.span("chart", "backtest_drawdowns"):
+    drawdowns = (result['equity'] / result['equity'].cummax() - 1) * 100
+    drawdown_long = drawdowns.rename(columns=PORTFOLIO_LABELS).reset_index().melt(id_vars='date', var_name='portfolio', value_name='drawdown')
+    drawdown_fig = px.line(
+        drawdown_long, x='date', y='drawdown', color='portfolio',
+        labels={'date': 'Date', 'drawdown': 'Drawdown (%)', 'portfolio': 'Portfolio'},
+        title='Drawdowns',
+    )
+    st.plotly_chart(drawdown_fig, width="stretch")
+
+with st.expander("Rebalances"):
+    rebalances = result['rebalances'].assign(turnover=lambda df: df['turnover'] * 100, costs=lambda df: df['costs'] * 100)
+    st.dataframe(rebalances.rename(columns={'holdings': 'Holdings', 'turnover': 'Turnover (%)', 'costs': 'Costs (% of initial value)'}).round(3), width="stretch")
+
+# Parameter sweep: the same strategy over every share of companies and rebalance frequency
+st.subheader("Parameter Sweep", divider=True)
+st.write("""
+The strategy above is backtested again for every share of companies and rebalancing frequency, with the same score, weighting and costs.
+The heatmap shows the selected metric of every combination, so a result that only holds for one setting stands out.
+""")
+SWEEP_METRICS = {'excess_return': 'Annualized Return vs Benchmark (%)', 'sharpe_ratio': 'Sharpe Ratio', 'information_ratio': 'Information Ratio', 'max_drawdown': 'Max Drawdown (%)'}
+sweep_metric = st.selectbox('Sweep metric:', list(SWEEP_METRICS), format_func=SWEEP_METRICS.get)
+runs = parameter_grid(
+    **{name: [value] for name, value in parameters.items() if name not in ('fraction', 'frequency')},
+    fraction=[0.05, 0.1, 0.2, 0.3, 0.4, 0.5],
+    frequency=list(REBALANCE_FREQUENCIES),
+)
+sweep = data.load_backtest_sweep(runs)
+
+with profiling.span("chart", "backtest_sweep"):
+    values = sweep.pivot(index='frequency', columns='fraction', values=sweep_metric).reindex(list(REBALANCE_FREQUENCIES))
+    if sweep_metric in ('excess_return', 'max_drawdown'):
+        values = values * 100
+    values.columns = [f"{fraction:.0%}" for fraction in values.columns]
+    sweep_fig = px.imshow(
+        values, text_auto='.2f', aspect='auto', color_continuous_scale='RdYlGn',
+        labels={'x': fraction_label.replace(' (%)', ''), 'y': 'Rebalancing', 'color': SWEEP_METRICS[sweep_metric]},
+        title=f"{SWEEP_METRICS[sweep_metric]} by Share of Companies and Rebalancing",
+    )
+    st.plotly_chart(sweep_fig, width="stretch")
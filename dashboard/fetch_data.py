@@ -2,7 +2,9 @@
 import time
 from typing import List
 from dotenv import load_dotenv
-from utils import generate_csv, convert_date, get_ticker_symbols
+from utils import generate_csv, get_ticker_symbols
+from utils import http_cache, raw_archive
+from utils.transform import build_esg_frame, build_pricing_frame, build_stock_frame
 import pandas as pd
 import finnhub
 import asyncio
@@ -17,7 +19,8 @@ os.chdir(script_dir)
 
 FMP_API_KEY= os.getenv('FMP_API_KEY')
 FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
-if not FMP_API_KEY or not FINNHUB_API_KEY:
+# Replayed runs serve every response from the provider cache (or the raw archive), so they don't need the keys
+if http_cache.PROVIDER_CACHE_MODE not in ("replay", "archive") and (not FMP_API_KEY or not FINNHUB_API_KEY):
   raise "The required API keys were not found in the .env file"
 
 # Get the list ticker symbols from the stock_list.json file
@@ -28,6 +31,7 @@ finnhub_client = finnhub.Client(FINNHUB_API_KEY)
 
 # ESG data
 esg_dataframe = pd.read_csv('../data/raw/esg-ratings.csv')
+esg_ticker_symbols = set(esg_dataframe['ticker'].str.upper())
 
 # Gets the raw esg row from the csv file, and returns it as a dictionary
 def get_esg_data(ticker_symbol: str):
@@ -35,100 +39,76 @@ def get_esg_data(ticker_symbol: str):
   return filtered_df.to_dict('records')[0] or None
 
 
-# Extraction functions. These functions will be used to extract data from the various sources
+# Extraction functions. These functions will be used to extract the raw data from the various sources
+# The raw responses are turned into table rows in bulk by utils/transform.py, and archived whole by utils/raw_archive.py
 def extract_stock_info(ticker_symbol: str):
   # Get general stock information from Finnhub, needed for the Stock table
   print(f"Fetching stock info from Finnhub for {ticker_symbol}")
-  company_profile_response = finnhub_client.company_profile2(symbol=ticker_symbol)
+  company_profile_response = http_cache.cached_call(
+    "finnhub.company_profile2", {"symbol": ticker_symbol}, lambda: finnhub_client.company_profile2(symbol=ticker_symbol), archive=True
+  )
   if not company_profile_response: return
   print(f"Fetching stock info from FMP for {ticker_symbol}")
   # Additional request for getting company description. Commented for now, but we can use it later
-  fmp_company_profile_response = fmpsdk.company_profile(FMP_API_KEY, ticker_symbol)
-  
-  return {
-    'ticker_symbol': ticker_symbol,
-    'name': company_profile_response['name'],
-    'industry': company_profile_response['finnhubIndustry'],
-    'market_cap': company_profile_response['marketCapitalization'],
-    'country': company_profile_response['country'],
-    'description': fmp_company_profile_response[0]['description'],
-    'logo': company_profile_response['logo'],
-    # Market cap data changes, so added current date to keep track of this
-    'updated_at': pd.Timestamp.now()
-  }
+  fmp_company_profile_response = http_cache.cached_call(
+    "fmp.company_profile", {"symbol": ticker_symbol}, lambda: fmpsdk.company_profile(FMP_API_KEY, ticker_symbol), archive=True
+  )
+  return company_profile_response, fmp_company_profile_response
 
 def extract_pricing_history(ticker_symbol: str):
   # Get pricing history data
-  extracted_pricing_history_list = []
   print(f"Fetching pricing history from FMP for {ticker_symbol}")
   # TODO: Make the date range bigger
-  daily_price_history = fmpsdk.historical_price_full(FMP_API_KEY, ticker_symbol, '2023-01-01', '2023-02-31')
-  for daily_price in daily_price_history:
-    pricing_history = {
-      'ticker_symbol': ticker_symbol,
-      'date': daily_price['date'],
-      'open': daily_price['open'],
-      'high': daily_price['high'],
-      'low': daily_price['low'],
-      'close': daily_price['close'],
-    }
-    extracted_pricing_history_list.append(pricing_history)
-  return extracted_pricing_history_list
-  
-# Extracts data from the csv, and returns as a row 
-def extract_esg_data(ticker_symbol: str):
-  # Get the raw row from the csv, based on the ticker_symbol
-  filtered_df = esg_dataframe[(esg_dataframe['ticker'].str.upper() == ticker_symbol)]
-  raw_esg_row = filtered_df.to_dict('records')[0] or None
-  if not raw_esg_row: return
-  print(f"Extracting ESG data for {ticker_symbol}")
-  # Extract & return the relevant data from the row
-  return {
-    'ticker_symbol': ticker_symbol,
-    'date': convert_date(raw_esg_row['last_processing_date']),
-    'total_score': raw_esg_row['total_score'],
-    'environment_score': raw_esg_row['environment_score'],
-    'social_score': raw_esg_row['social_score'],
-    'governance_score': raw_esg_row['governance_score'],
-  }
+  return http_cache.cached_call(
+    "fmp.historical_price_full",
+    {"symbol": ticker_symbol, "from": '2023-01-01', "to": '2023-02-31'},
+    lambda: fmpsdk.historical_price_full(FMP_API_KEY, ticker_symbol, '2023-01-01', '2023-02-31'),
+    archive=True
+  )
+
+# The ESG data comes from the csv, so only check whether there is a row for the ticker_symbol
+def has_esg_data(ticker_symbol: str):
+  return ticker_symbol in esg_ticker_symbols
+
 # This function will be used to extract the data from the various sources
 # It will only add the data for a ticker_symbol to the list, if data is found for all the tables
 def extract_data():
-  # Initialize lists to store the data. This corresponds to the tables in the database
-  stocks_info_list = []
-  pricing_history_list = []
-  esg_history_list = []
+  # Initialize the lists and dict to store the raw responses, per ticker_symbol
+  extracted_ticker_symbols = []
+  finnhub_profiles = []
+  fmp_profiles = []
+  price_histories = {}
   
   # Loop through the ticker_symbols and gather the data from the various sources
   for ticker_symbol in ticker_symbols:
+    live_calls = http_cache.call_stats["live"]
     successful_execution = False
     # This will make sure no stocks get skipped when rotating API keys
     while not successful_execution:
       try:
+        # ESG_history table. Checked first, as it doesn't need any API requests
+        if not has_esg_data(ticker_symbol):
+          print("No ESG data found for ", ticker_symbol, ". Skipping...")
+          break
+
         # Stock table
-        stock_row = extract_stock_info(ticker_symbol)
-        if not stock_row:
+        stock_info = extract_stock_info(ticker_symbol)
+        if not stock_info:
           # If no data is found for the current ticker_symbol, skip to the next ticker_symbol
           print("No stock data found for ", ticker_symbol + ". Skipping...")
           break
-        stocks_info_list.append(stock_row)
-        # Pricing_history table 
-        extracted_pricing_history_list = extract_pricing_history(ticker_symbol)
-        if not extracted_pricing_history_list:
+
+        # Pricing_history table
+        daily_price_history = extract_pricing_history(ticker_symbol)
+        if not daily_price_history:
           print("No pricing history data found for ", ticker_symbol, ". Skipping...")
-          stocks_info_list.pop()
-          break
-        
-        # ESG_history table
-        esg_row = extract_esg_data(ticker_symbol)
-        if not esg_row:
-          print("No ESG data found for ", ticker_symbol, ". Skipping...")
-          stocks_info_list.pop()
           break
-          
-        # This is done in this step, to make sure this list is only added when there is also ESG data for the current ticker_symbol
-        pricing_history_list = [*pricing_history_list, *extracted_pricing_history_list]
-        esg_history_list.append(esg_row)
+
+        # This is done in this step, to make sure the data is only added when it was found for all the tables
+        extracted_ticker_symbols.append(ticker_symbol)
+        finnhub_profiles.append(stock_info[0])
+        fmp_profiles.append(stock_info[1])
+        price_histories[ticker_symbol] = daily_price_history
         
         print(f"Extracted data for stock {ticker_symbol}")
         successful_execution = True
@@ -141,15 +121,26 @@ def extract_data():
         global finnhub_client
         finnhub_client =  finnhub.Client(FINNHUB_API_KEY)
         rotation_count += 1
-    time.sleep(0.8)
-  return stocks_info_list, pricing_history_list, esg_history_list
-  
+    # Only wait for the rate limit when the providers were actually called
+    if http_cache.call_stats["live"] > live_calls:
+      time.sleep(0.8)
+
+  # Build the tables from all the raw responses at once
+  stock_frame = build_stock_frame(extracted_ticker_symbols, finnhub_profiles, fmp_profiles)
+  pricing_history_frame = build_pricing_frame(price_histories)
+  esg_history_frame = build_esg_frame(extracted_ticker_symbols, esg_dataframe)
+  return stock_frame, pricing_history_frame, esg_history_frame
+
 async def main():
   print("Extracting data...")
-  stocks_info_list, pricing_history_list, esg_history_list = extract_data()
-  generate_csv(stocks_info_list, '../data/transformed/stock.csv')
-  generate_csv(pricing_history_list, '../data/transformed/pricing_history.csv', index=True)
-  generate_csv(esg_history_list, '../data/transformed/esg_history.csv', index=True)
+  stock_frame, pricing_history_frame, esg_history_frame = extract_data()
+  generate_csv(stock_frame, '../data/transformed/stock.csv')
+  generate_csv(pricing_history_frame, '../data/transformed/pricing_history.csv', index=True)
+  generate_csv(esg_history_frame, '../data/transformed/esg_history.csv', index=True)
+  print(f"Provider responses: {http_cache.call_stats['cached']} from cache, {http_cache.call_stats['live']} live")
+  # Compact the raw responses of the previous days into columnar files
+  compacted = raw_archive.compact()
+  print(f"Compacted {sum(compacted.values())} archived responses of {len(compacted)} endpoint days")
   print("Done :)")
 
 if __name__ == '__main__':
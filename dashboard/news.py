@@ -1,12 +1,17 @@
-import requests
 import pandas as pd
 import streamlit as st
 
+from utils import http_cache
+
+# requests is only imported when the news isn't served from the provider cache
+def fetch_json(url):
+    import requests
+    return requests.get(url).json()
+
 @st.cache_data
 def fetch_news_data():
     url = "https://finnhub.io/api/v1/news?category=general&token=cscc8hpr01qgt32f7ju0cscc8hpr01qgt32f7jug"
-    response = requests.get(url)
-    json_data = response.json()
+    json_data = http_cache.cached_call("finnhub.news", {"category": "general"}, lambda: fetch_json(url))
     df = pd.DataFrame(json_data)
     df['datetime'] = pd.to_datetime(df['datetime'], unit='s')
     return df
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+import streamlit as st
+
+from utils import data, profiling
+from utils.screener import NUMERIC_FEATURES
+
+# Page Title and Description
+st.title("Stock Screener")
+st.markdown("""
+Screen all stocks on their **ESG scores**, **market cap** and **risk and return** metrics at once.
+Set the filters in the sidebar, and choose how the matching stocks are sorted.
+""")
+
+# Labels of the features, and the unit numeric features are shown in on the sliders
+FEATURE_LABELS = {
+    'total_score': 'Total ESG Score',
+    'environment_score': 'Environment Score',
+    'social_score': 'Social Score',
+    'governance_score': 'Governance Score',
+    'market_cap': 'Market Cap (Billions)',
+    'sharpe_ratio': 'Sharpe Ratio',
+    'total_return_percentage': 'Total Return (%)',
+    'annualized_mean_return': 'Annualized Mean Return',
+    'annualized_std_return': 'Annualized Volatility',
+    'industry': 'Industry',
+    'country': 'Country',
+    'name': 'Stock Name',
+    'ticker_symbol': 'Ticker',
+}
+FEATURE_UNITS = {'market_cap': 1e9}
+
+# Cached feature table with its sorted and bitmap indexes (see utils/screener.py)
+screener = data.load_stock_screener()
+profiling.record_frame("screener_features", screener.features)
+
+# Sidebar filters
+st.sidebar.header("Screener Filters")
+sets = {}
+for column in ['industry', 'country']:
+    selected_values = st.sidebar.multiselect(FEATURE_LABELS[column], sorted(screener.bitmaps[column]))
+    if selected_values:
+        sets[column] = selected_values
+
+ranges = {}
+for column in NUMERIC_FEATURES:
+    sorted_values, _ = screener.sorted_indexes[column]
+    if len(sorted_values) == 0 or sorted_values[0] == sorted_values[-1]:
+        continue
+    unit = FEATURE_UNITS.get(column, 1)
+    # Round outwards, so the slider range always contains every stock
+    lower, upper = np.floor(sorted_values[0] / unit * 100) / 100, np.ceil(sorted_values[-1] / unit * 100) / 100
+    selected_range = st.sidebar.slider(FEATURE_LABELS[column], min_value=float(lower), max_value=float(upper), value=(float(lower), float(upper)))
+    # Only filter on features whose range was changed
+    if selected_range != (float(lower), float(upper)):
+        ranges[column] = (selected_range[0] * unit, selected_range[1] * unit)
+
+# Sort settings
+col1, col2, col3 = st.columns([2, 1, 1])
+with col1:
+    sort_by = st.selectbox("Sort by", NUMERIC_FEATURES, format_func=FEATURE_LABELS.get)
+with col2:
+    sort_order = st.radio("Order", ('Highest first', 'Lowest first'), horizontal=True)
+with col3:
+    top_n = st.number_input("Number of stocks", min_value=10, max_value=1000, value=50, step=10)
+
+# Run the screen
+with profiling.span("transform", "screen_stocks"):
+    start = time.perf_counter()
+    top_stocks, matches = screener.screen(ranges, sets, sort_by=sort_by, n=int(top_n), ascending=sort_order == 'Lowest first')
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+st.caption(f"{matches} of {screener.size} stocks match the filters (screened in {elapsed_ms:.1f} ms)")
+
+if top_stocks.empty:
+    st.warning("No stocks match the selected filters. Please widen the filters.")
+else:
+    display_columns = ['name', 'ticker_symbol', 'industry', 'country', *NUMERIC_FEATURES]
+    top_stocks_display = top_stocks[display_columns].copy()
+    top_stocks_display['market_cap'] = top_stocks_display['market_cap'] / FEATURE_UNITS['market_cap']
+    st.dataframe(top_stocks_display.rename(columns=FEATURE_LABELS).round(2), hide_index=True)
@@ -0,0 +1,5 @@
+# The dashboard modules import each other as `utils.*`, from the dashboard directory
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
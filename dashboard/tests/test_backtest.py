@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from utils.backtest import BACKTEST_METRICS, BacktestData, backtest, performance_metrics, rebalance_positions, target_weights
+
+def backtest_data(late_score_date):
+    dates = pd.bdate_range('2023-01-02', periods=120)
+    prices = pd.DataFrame(
+        100 * np.exp(np.cumsum(np.full((len(dates), 3), 0.001), axis=0)),
+        index=dates, columns=['AAA', 'BBB', 'CCC'],
+    )
+    history = pd.DataFrame({
+        'ticker_symbol': ['AAA', 'BBB', 'CCC'],
+        'industry': ['Tech', 'Tech', 'Tech'],
+        'date': [dates[0], dates[0], late_score_date],
+        'total_score': [500.0, 400.0, 900.0],
+        'environment_score': [500.0, 400.0, 900.0],
+        'social_score': [500.0, 400.0, 900.0],
+        'governance_score': [500.0, 400.0, 900.0],
+    })
+    return BacktestData(prices, history)
+
+# A ticker whose score is published late must not be selected on the rebalances before
+def test_scores_are_not_used_before_they_are_published():
+    late = pd.Timestamp('2023-03-15')
+    data = backtest_data(late)
+    positions = rebalance_positions(data.dates, 'Monthly')
+    weights = target_weights(data, positions, 'top_esg', 'total_score', 0.34, 'equal', False)
+
+    before = data.dates[positions] < late
+    ccc = data.tickers.get_loc('CCC')
+    assert before.any() and (~before).any()
+    assert (weights[before, ccc] == 0).all()
+    assert (weights[before, data.tickers.get_loc('AAA')] == 1).all()
+    assert (weights[~before, ccc] == 1).all()
+
+# Rebalances before the first published score hold cash
+def test_strategy_holds_cash_before_any_score():
+    data = backtest_data(pd.Timestamp('2023-03-15'))
+    data.score_dates = data.score_dates[1:]
+    data.scores = {score: values[1:] for score, values in data.scores.items()}
+    result = backtest(data, fraction=0.34, cost_bps=0.0)
+    assert (result['equity'].loc[:'2023-03-14', 'strategy'] == 1).all()
+
+def test_performance_metrics_of_a_single_date_are_nan():
+    metrics = performance_metrics(np.ones(1), np.ones(1), np.zeros(1), np.zeros(1), np.zeros(1))
+    assert list(metrics) == BACKTEST_METRICS
+    assert all(np.isnan(value) for value in metrics.values())
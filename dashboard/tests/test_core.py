@@ -0,0 +1,31 @@
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from utils.core import Workspace
+from utils.frames import build_typed_frame
+
+def esg_market():
+    return build_typed_frame(pd.DataFrame({
+        'name': ['Alpha', 'Alpha', 'Beta', 'Beta'],
+        'ticker_symbol': ['AAA', 'AAA', 'BBB', 'BBB'],
+        'total_score': ['500', '500', '700', '700'],
+        'industry': ['Tech', 'Tech', 'Energy', 'Energy'],
+        'market_cap': ['1500', '1500', '2500', '2500'],
+        'date': ['2023-01-02', '2023-01-03', '2023-01-02', '2023-01-03'],
+        'close': ['10.00', '11.00', '20.00', '19.00'],
+    }), "esg_market")
+
+# The query results are cached, so market_data must not change them (e.g. scale the market cap twice)
+def test_market_data_leaves_cached_query_unchanged():
+    workspace = Workspace("postgresql+psycopg2://user@localhost/unused")
+    raw = esg_market()
+    expected = raw.copy()
+    workspace.query = lambda name: raw
+
+    first = workspace.market_data()
+    workspace.clear()
+    second = workspace.market_data()
+
+    assert_frame_equal(raw, expected)
+    assert_frame_equal(first, second)
+    assert first['market_cap'].tolist() == [1.5e9, 1.5e9, 2.5e9, 2.5e9]
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from utils.factors import fama_macbeth_summary, return_attribution, rolling_factor_regressions
+
+# Random walk prices without any size or ESG effect. The market cap is today's, so it already
+# contains every past return
+def null_data(tickers=300, days=756, seed=1):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2021-01-01', periods=days)
+    prices = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, tickers)), axis=0)),
+        index=dates, columns=[f"T{i}" for i in range(tickers)],
+    )
+    industries = rng.choice(['Energy', 'Retail', 'Technology', 'Utilities'], tickers)
+    stocks = pd.DataFrame({
+        'ticker_symbol': prices.columns,
+        'industry': industries,
+        'market_cap': np.exp(rng.normal(0, 1, tickers)) * prices.iloc[-1].to_numpy(),
+    })
+    score_history = pd.DataFrame({
+        'ticker_symbol': prices.columns,
+        'industry': industries,
+        'date': dates[0],
+        **{column: rng.normal(500, 100, tickers) for column in ('total_score', 'environment_score', 'social_score', 'governance_score')},
+    })
+    return prices, stocks, score_history
+
+def test_size_is_not_priced_in_null_data():
+    prices, stocks, score_history = null_data()
+    window = 63
+    summary = fama_macbeth_summary(rolling_factor_regressions(prices, stocks, score_history, window), window).set_index('factor')
+    assert abs(summary.loc['size', 't_stat']) < 2
+    assert 0.1 < summary.loc['size', 'positive_share'] < 0.9
+    attribution = return_attribution(prices, stocks, score_history)
+    assert abs(attribution['coefficients'].set_index('factor').loc['size', 't_stat']) < 2
+
+# Windows starting before a ticker's first published score leave the ticker out
+def test_scores_are_not_used_before_they_are_published():
+    prices, stocks, score_history = null_data()
+    late = prices.index[400]
+    score_history.loc[score_history.index[:100], 'date'] = late
+    regressions = rolling_factor_regressions(prices, stocks, score_history, 63)
+    tickers = regressions.drop_duplicates('window_end').set_index('window_end')['tickers']
+    window_starts = prices.index[np.maximum(prices.index.get_indexer(tickers.index) - 63, 0)]
+    assert (tickers[window_starts < late] == 200).all()
+    assert (tickers[window_starts >= late] == 300).all()
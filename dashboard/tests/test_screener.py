@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from utils.screener import CATEGORICAL_FEATURES, NUMERIC_FEATURES, StockScreener
+
+def features():
+    frame = pd.DataFrame({column: np.arange(4, dtype=np.float64) for column in NUMERIC_FEATURES})
+    frame['ticker_symbol'] = ['AAA', 'BBB', 'CCC', 'DDD']
+    frame['sharpe_ratio'] = [0.5, np.nan, 1.5, np.nan]
+    for column in CATEGORICAL_FEATURES:
+        frame[column] = 'Tech'
+    return frame
+
+# Every match is counted and returned, the ones without a value of the sort column last
+def test_matches_without_a_sort_value_are_returned_last():
+    screener = StockScreener(features())
+    for ascending, expected in ((False, ['CCC', 'AAA']), (True, ['AAA', 'CCC'])):
+        rows, matches = screener.screen(sort_by='sharpe_ratio', ascending=ascending)
+        assert matches == 4
+        assert rows['ticker_symbol'].tolist() == [*expected, 'BBB', 'DDD']
+    rows, matches = screener.screen(sort_by='sharpe_ratio', n=3)
+    assert rows['ticker_symbol'].tolist() == ['CCC', 'AAA', 'BBB']
@@ -5,7 +5,7 @@ import os
 import pandas as pd
 
 def generate_csv(data: dict, filename: str, index=False):
-  df = pd.DataFrame.from_dict(data) 
+  df = data if isinstance(data, pd.DataFrame) else pd.DataFrame.from_dict(data)
   df.to_csv(filename, index=index)
 
 # Converts date to YYYY-MM-DD format
@@ -0,0 +1,156 @@
+# Pandas computations behind the dashboard pages.
+# They take the raw query results and return the frames the pages plot, so they
+# can be reused and benchmarked without running Streamlit.
+import numpy as np
+import pandas as pd
+
+# Fixed annual risk-free rate used for the Sharpe ratio
+ANNUAL_RISK_FREE_RATE = 0.02
+TRADING_DAYS = 252
+
+# Every published ESG score (the esg_score_history query) as of every publication date:
+# returns the publication dates and, per column, a publication date x ticker matrix with the
+# latest score of every ticker published by then, NaN before its first published score
+def published_scores(score_history, tickers, columns):
+    dates = pd.to_datetime(score_history['date'])
+    score_dates = pd.DatetimeIndex(np.sort(dates.unique()))
+    rows = score_dates.get_indexer(dates)
+    positions = pd.Index(tickers).get_indexer(score_history['ticker_symbol'].astype(str))
+    known = positions >= 0
+    scores = {}
+    for column in columns:
+        published = np.full((len(score_dates), len(tickers)), np.nan)
+        published[rows[known], positions[known]] = pd.to_numeric(score_history[column], errors='coerce').to_numpy(dtype=np.float64)[known]
+        scores[column] = pd.DataFrame(published).ffill().to_numpy()
+    return score_dates, scores
+
+# Rows (date x ticker) of a published_scores matrix as of every date of `dates`, NaN before the
+# first publication date, so no date sees a score published after it
+def scores_as_of(score_dates, scores, dates):
+    rows = np.searchsorted(score_dates, dates, side='right') - 1
+    return np.where((rows >= 0)[:, None], scores[np.maximum(rows, 0)], np.nan)
+
+# Function to calculate annual total returns
+def calculate_annual_returns(df):
+    df['year'] = df['date'].dt.year
+    df = df.sort_values(by=['ticker_symbol', 'date'])
+    annual_returns = df.groupby(['ticker_symbol', 'year'], observed=True).apply(
+        lambda x: (x['close'].iloc[-1] - x['close'].iloc[0]) / x['close'].iloc[0] * 100
+    ).reset_index(name='annual_total_return_percentage')
+    return df.merge(annual_returns, on=['ticker_symbol', 'year'], how='left')
+
+# Converts the raw (all TEXT) market query result and adds the annual returns
+# (on a copy, the query results are cached and shared)
+def prepare_market_data(df_market):
+    df_market = df_market.copy()
+    df_market['total_score'] = pd.to_numeric(df_market['total_score'], errors='coerce')
+    df_market['market_cap'] = pd.to_numeric(df_market['market_cap'], errors='coerce') * 1e6  # Adjusting to full market cap values
+    df_market['close'] = pd.to_numeric(df_market['close'], errors='coerce')
+    df_market['date'] = pd.to_datetime(df_market['date'])
+    df_market = df_market.dropna(subset=['market_cap', 'close', 'total_score'])  # Drop rows with NaN in key columns
+    return calculate_annual_returns(df_market)
+
+# Calculates the annualized return, volatility and Sharpe ratio of every company
+def calculate_sharpe_ratios(df_risk, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE):
+    # Convert 'date' to datetime and ensure 'close' prices are numeric (on a copy of the cached query result)
+    df_risk = df_risk.copy()
+    df_risk['date'] = pd.to_datetime(df_risk['date'])
+    df_risk['close'] = pd.to_numeric(df_risk['close'], errors='coerce')
+
+    # Sort data by ticker symbol and date to ensure proper return calculations
+    df_risk = df_risk.sort_values(by=['ticker_symbol', 'date'])
+
+    # Calculate daily log returns for each company
+    df_risk['log_return'] = df_risk.groupby('ticker_symbol', observed=True)['close'].transform(lambda x: np.log(x / x.shift(1)))
+
+    # Group by company to calculate mean and standard deviation of daily log returns
+    company_stats = df_risk.groupby('ticker_symbol', observed=True).agg({
+        'log_return': ['mean', 'std', 'sum'],  # Mean, standard deviation and sum of log returns
+        'total_esg_score': 'mean'              # Average total ESG score for the company
+    }).reset_index()
+
+    # Flatten multi-index columns
+    company_stats.columns = ['ticker_symbol', 'mean_log_return', 'std_log_return', 'sum_log_return', 'total_esg_score']
+    return annualize_company_stats(company_stats, annual_risk_free_rate)
+
+# Adds the total return, annualized return and volatility and the Sharpe ratio to the per-company
+# mean, standard deviation and sum of the daily log returns
+def annualize_company_stats(company_stats, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE):
+    # Total return over the whole price history
+    company_stats['total_return_percentage'] = np.expm1(company_stats['sum_log_return']) * 100
+
+    # Annualize the mean and standard deviation of log returns
+    company_stats['annualized_mean_return'] = company_stats['mean_log_return'] * TRADING_DAYS
+    company_stats['annualized_std_return'] = company_stats['std_log_return'] * np.sqrt(TRADING_DAYS)
+
+    # Calculate the annualized Sharpe Ratio for each company
+    company_stats['sharpe_ratio'] = (company_stats['annualized_mean_return'] - annual_risk_free_rate) / company_stats['annualized_std_return']
+
+    # Drop rows with missing or invalid data
+    return company_stats.dropna(subset=['sharpe_ratio', 'total_esg_score'])
+
+# Moving average of the closing price, averaging `avenr` days before and after each date
+def moving_average(close, avenr):
+    return [np.mean(close[max(0, j - avenr):min(len(close), j + avenr)]) for j in range(len(close))]
+
+# Per-ticker feature table of the screener: attributes and ESG scores joined with the return statistics
+def build_stock_features(stocks, company_stats):
+    stats = company_stats[['ticker_symbol', 'sharpe_ratio', 'total_return_percentage', 'annualized_mean_return', 'annualized_std_return']].copy()
+    stats['ticker_symbol'] = stats['ticker_symbol'].astype(str)
+    features = stocks.merge(stats, on='ticker_symbol', how='left')
+    numeric_columns = features.columns.difference(['ticker_symbol', 'name', 'industry', 'country'])
+    features[numeric_columns] = features[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    return features
+
+# Pivots daily closing prices into a date x ticker matrix, aligned on the trading dates
+def build_price_matrix(df):
+    return df.pivot_table(index='date', columns='ticker_symbol', values='close', observed=True).sort_index()
+
+# Normalized performance, rolling annualized volatility and drawdown of every column of an
+# aligned price matrix, computed for all tickers at once
+def compare_price_matrix(price_matrix, window=20):
+    prices = price_matrix.to_numpy(dtype=np.float64)
+    first_prices = price_matrix.bfill().to_numpy(dtype=np.float64)[0]
+    log_returns = np.diff(np.log(prices), axis=0, prepend=np.nan)
+    # fmax ignores missing prices, so gaps don't reset the running maximum
+    running_max = np.fmax.accumulate(prices, axis=0)
+
+    def to_frame(values):
+        return pd.DataFrame(values, index=price_matrix.index, columns=price_matrix.columns)
+
+    return {
+        'normalized': to_frame(prices / first_prices * 100),
+        'volatility': to_frame(log_returns).rolling(window, min_periods=2).std() * np.sqrt(TRADING_DAYS),
+        'drawdown': to_frame((prices / running_max - 1) * 100),
+    }
+
+# Frequencies of the industry margin chart, as pandas period codes
+MARGIN_FREQUENCIES = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M', 'Quarterly': 'Q'}
+
+# Sum and count of the daily margins (close vs open, in %) of every industry and date, computed
+# in one grouped pass over the raw bars. Every frequency of the margin chart is rolled up from it
+def calculate_daily_industry_margins(df):
+    open_prices = pd.to_numeric(df['open']).to_numpy(dtype=np.float64)
+    close_prices = pd.to_numeric(df['close']).to_numpy(dtype=np.float64)
+    margins = pd.DataFrame({
+        'industry': df['industry'],
+        'date': pd.to_datetime(df['date']),
+        'margin': (close_prices - open_prices) / open_prices * 100,
+    })
+    daily = margins.groupby(['industry', 'date'], observed=True)['margin'].agg(['sum', 'count']).reset_index()
+    daily['industry'] = daily['industry'].astype(str)
+    return daily
+
+# Average daily margin of every industry per period of `frequency` (a MARGIN_FREQUENCIES key),
+# with the start of the period as a timestamp
+def roll_up_industry_margins(daily, frequency):
+    period = daily['date'].dt.to_period(MARGIN_FREQUENCIES[frequency]).dt.start_time.rename('period')
+    totals = daily.groupby([daily['industry'], period])[['sum', 'count']].sum()
+    return (totals['sum'] / totals['count']).rename('margin').reset_index()
+
+# Tick labels of the margin chart periods, e.g. "Q1 2023" for quarters or "Mar 2023" for months
+def format_period_labels(periods, frequency):
+    periods = pd.Series(periods)
+    if frequency == 'Quarterly':
+        return 'Q' + periods.dt.quarter.astype(str) + ' ' + periods.dt.year.astype(str)
+    return periods.dt.strftime({'Daily': '%Y-%m-%d', 'Weekly': 'Week of %d %b %Y', 'Monthly': '%b %Y'}[frequency])
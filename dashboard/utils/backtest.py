@@ -0,0 +1,232 @@
+# Backtests of ESG-screened portfolios.
+# BacktestData aligns everything a backtest reads once per data version: the date x ticker
+# matrix of cumulative log growth (from the risk price matrix), the ESG scores of every ticker
+# as of every publication date and the industry of every ticker. A backtest then only picks
+# the target weights of all rebalance dates at once and walks the rebalance periods: the value
+# of a period is its weights times the growth since the rebalance, one matrix product per
+# period, so a 10-year monthly backtest over hundreds of tickers takes milliseconds. Parameter
+# sweeps run many backtests over the same data, over a process pool when they are large.
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import ANNUAL_RISK_FREE_RATE, TRADING_DAYS, published_scores, scores_as_of
+from utils.risk import log_return_matrix
+
+SCORE_LABELS = {
+    'total_score': 'Total ESG Score',
+    'environment_score': 'Environment Score',
+    'social_score': 'Social Score',
+    'governance_score': 'Governance Score',
+}
+# 'top_esg' holds the best scored `fraction` of the universe, 'exclude_laggards' holds
+# everything but the worst scored `fraction`
+STRATEGY_LABELS = {'top_esg': 'Top ESG', 'exclude_laggards': 'Exclude ESG laggards'}
+WEIGHTING_LABELS = {'equal': 'Equal weight', 'score': 'Score weight'}
+# Rebalance frequencies and their pandas period codes. Portfolios are rebalanced at the close
+# of the last trading day of every period
+REBALANCE_FREQUENCIES = {'Monthly': 'M', 'Quarterly': 'Q', 'Annually': 'Y'}
+DEFAULT_PARAMETERS = {
+    'strategy': 'top_esg',
+    'score': 'total_score',
+    'fraction': 0.2,
+    'frequency': 'Monthly',
+    'cost_bps': 10.0,
+    'weighting': 'equal',
+    'industry_neutral': False,
+}
+# Below this many runs starting the pool and pickling the data costs more than it saves: every
+# spawned worker costs about 1.1s to start (700 companies x 10 years, see benchmarks/README.md),
+# against about 40ms per run, so even 4 workers on 4 free cores only pay off from about 150 runs
+PARALLEL_MIN_RUNS = int(os.getenv("DASHBOARD_BACKTEST_PARALLEL_MIN_RUNS", 256))
+BACKTEST_WORKERS = int(os.getenv("DASHBOARD_BACKTEST_WORKERS", os.cpu_count() or 1))
+
+BACKTEST_METRICS = [
+    'total_return', 'annualized_return', 'annualized_volatility', 'sharpe_ratio', 'max_drawdown',
+    'tracking_error', 'information_ratio', 'annual_turnover', 'total_costs', 'average_holdings',
+]
+
+# Aligned inputs of the backtests, built from the risk price matrix (date x ticker) and every
+# published ESG score (the esg_score_history query)
+class BacktestData:
+    def __init__(self, price_matrix, score_history):
+        self.dates = pd.DatetimeIndex(price_matrix.index)
+        self.tickers = price_matrix.columns.astype(str)
+        prices = price_matrix.to_numpy(dtype=np.float64)
+        # A ticker can be bought on the days it has a price. Gaps keep the last price, so the
+        # return over a gap is booked on the next price and a delisted ticker holds its value
+        self.tradable = np.isfinite(prices)
+        filled = pd.DataFrame(prices).ffill().to_numpy()
+        self.log_growth = np.cumsum(np.nan_to_num(log_return_matrix(filled)), axis=0)
+
+        # Scores as of every publication date: the latest published score of every ticker, NaN
+        # (not eligible) before its first published score, so no rebalance sees a future score
+        self.score_dates, self.scores = published_scores(score_history, self.tickers, SCORE_LABELS)
+
+        history = score_history.assign(ticker_symbol=score_history['ticker_symbol'].astype(str))
+        industries = history.drop_duplicates('ticker_symbol', keep='last').set_index('ticker_symbol')['industry']
+        self.industry_codes = pd.factorize(industries.reindex(self.tickers), use_na_sentinel=False)[0]
+
+    # Scores (rebalance x ticker) as of the dates at `positions`, NaN before the first publication date
+    def scores_at(self, score, positions):
+        return scores_as_of(self.score_dates, self.scores[score], self.dates[positions])
+
+# Positions of the rebalance dates: the first date, then the last date of every period but the last
+def rebalance_positions(dates, frequency):
+    periods = dates.to_period(REBALANCE_FREQUENCIES[frequency])
+    period_ends = np.flatnonzero(periods[1:] != periods[:-1])
+    return np.unique(np.concatenate([[0], period_ends]))
+
+# Target weights (rebalance x ticker) of a strategy. Tickers without a price or score on a
+# rebalance date are not eligible, and the strategy holds cash when no ticker is. With
+# industry_neutral the fraction is taken per industry
+def target_weights(data, positions, strategy, score, fraction, weighting, industry_neutral):
+    scores = data.scores_at(score, positions)
+    scores = np.where(data.tradable[positions] & np.isfinite(scores), scores, np.nan)
+    groups = data.industry_codes if industry_neutral else np.zeros(len(data.tickers), dtype=np.intp)
+
+    selected = np.zeros(scores.shape, dtype=bool)
+    with warnings.catch_warnings():
+        # Rebalance dates without eligible tickers in a group have no threshold
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for group in np.unique(groups):
+            columns = groups == group
+            block = scores[:, columns]
+            if strategy == 'top_esg':
+                selected[:, columns] = block >= np.nanquantile(block, 1 - fraction, axis=1, keepdims=True)
+            else:
+                selected[:, columns] = block > np.nanquantile(block, fraction, axis=1, keepdims=True)
+
+    raw = selected * (np.nan_to_num(scores) if weighting == 'score' else 1.0)
+    totals = raw.sum(axis=1, keepdims=True)
+    return np.divide(raw, totals, out=np.zeros_like(raw, dtype=np.float64), where=totals > 0)
+
+# Equal weights of every eligible ticker on every rebalance date
+def benchmark_weights(data, positions):
+    eligible = data.tradable[positions].astype(np.float64)
+    totals = eligible.sum(axis=1, keepdims=True)
+    return np.divide(eligible, totals, out=np.zeros_like(eligible), where=totals > 0)
+
+# Daily value (starting at 1) of a portfolio rebalanced to `weights` at `positions`, with
+# `cost_rate` of the traded value paid at every rebalance. Weights drift with the prices
+# between rebalances. Returns the values and the turnover (traded value / portfolio value)
+# and costs of every rebalance
+def simulate_portfolio(data, positions, weights, cost_rate):
+    ends = np.append(positions[1:], len(data.dates) - 1)
+    values = np.ones(len(data.dates))
+    turnover = np.empty(len(positions))
+    costs = np.empty(len(positions))
+    drifted = np.zeros(len(data.tickers))
+    value = 1.0
+    for k, (start, end) in enumerate(zip(positions, ends)):
+        target = weights[k]
+        turnover[k] = np.abs(target - drifted).sum()
+        costs[k] = value * cost_rate * turnover[k]
+        value -= costs[k]
+
+        held = np.flatnonzero(target)
+        growth = np.exp(data.log_growth[start:end + 1, held] - data.log_growth[start, held])
+        path = growth @ target[held] if len(held) else np.ones(end - start + 1)
+        values[start:end + 1] = value * path
+        drifted = np.zeros(len(data.tickers))
+        if len(held):
+            drifted[held] = target[held] * growth[-1] / path[-1]
+        value = values[end]
+    return values, turnover, costs
+
+# Return, risk and trading metrics of a portfolio's daily values against the benchmark's.
+# All metrics are NaN for fewer than two dates, which have no returns
+def performance_metrics(values, benchmark_values, turnover, costs, holdings, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE):
+    if len(values) < 2:
+        return dict.fromkeys(BACKTEST_METRICS, np.nan)
+    years = (len(values) - 1) / TRADING_DAYS
+    daily = values[1:] / values[:-1] - 1
+    active = daily - (benchmark_values[1:] / benchmark_values[:-1] - 1)
+    annualized_return = values[-1] ** (1 / years) - 1
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # A single daily return has no standard deviation
+        warnings.simplefilter('ignore', RuntimeWarning)
+        annualized_volatility = daily.std(ddof=1) * np.sqrt(TRADING_DAYS)
+        tracking_error = active.std(ddof=1) * np.sqrt(TRADING_DAYS)
+        return {
+            'total_return': values[-1] - 1,
+            'annualized_return': annualized_return,
+            'annualized_volatility': annualized_volatility,
+            'sharpe_ratio': (annualized_return - annual_risk_free_rate) / annualized_volatility,
+            'max_drawdown': (values / np.maximum.accumulate(values) - 1).min(),
+            'tracking_error': tracking_error,
+            'information_ratio': (annualized_return - (benchmark_values[-1] ** (1 / years) - 1)) / tracking_error,
+            # The first rebalance buys the initial portfolio and isn't counted as turnover
+            'annual_turnover': turnover[1:].sum() / years,
+            'total_costs': costs.sum(),
+            'average_holdings': holdings.mean(),
+        }
+
+# Backtest of one strategy against the equal-weight portfolio of all eligible tickers, both
+# rebalanced at the same dates with the same costs. Returns the daily values of both
+# ('equity', indexed by date), their metrics ('metrics', indexed by portfolio) and the
+# holdings, turnover and costs of every rebalance ('rebalances')
+def backtest(data, strategy='top_esg', score='total_score', fraction=0.2, frequency='Monthly', cost_bps=10.0,
+             weighting='equal', industry_neutral=False, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE):
+    positions = rebalance_positions(data.dates, frequency)
+    cost_rate = cost_bps / 1e4
+    weights = target_weights(data, positions, strategy, score, fraction, weighting, industry_neutral)
+    market = benchmark_weights(data, positions)
+    values, turnover, costs = simulate_portfolio(data, positions, weights, cost_rate)
+    benchmark_values, benchmark_turnover, benchmark_costs = simulate_portfolio(data, positions, market, cost_rate)
+
+    holdings = (weights > 0).sum(axis=1)
+    metrics = pd.DataFrame({
+        'strategy': performance_metrics(values, benchmark_values, turnover, costs, holdings, annual_risk_free_rate),
+        'benchmark': performance_metrics(benchmark_values, benchmark_values, benchmark_turnover, benchmark_costs,
+                                         (market > 0).sum(axis=1), annual_risk_free_rate),
+    }).T.rename_axis('portfolio')
+    return {
+        'equity': pd.DataFrame({'strategy': values, 'benchmark': benchmark_values}, index=data.dates.rename('date')),
+        'metrics': metrics,
+        'rebalances': pd.DataFrame({'holdings': holdings, 'turnover': turnover, 'costs': costs}, index=data.dates[positions].rename('date')),
+    }
+
+# Strategy metrics of one sweep run, plus the difference in annualized return to the benchmark
+def _sweep_run(data, parameters):
+    metrics = backtest(data, **parameters)['metrics']
+    return {
+        **parameters,
+        **metrics.loc['strategy'].to_dict(),
+        'excess_return': metrics.loc['strategy', 'annualized_return'] - metrics.loc['benchmark', 'annualized_return'],
+    }
+
+# Every worker process receives the data once, instead of once per run
+_worker_data = None
+
+def _init_sweep_worker(data):
+    global _worker_data
+    _worker_data = data
+
+def _sweep_worker_run(parameters):
+    return _sweep_run(_worker_data, parameters)
+
+# Backtests of every parameter set of `runs` (dicts of backtest() arguments, the missing ones
+# taken from DEFAULT_PARAMETERS), one row per run. Sweeps of at least `parallel_min_runs` runs
+# (PARALLEL_MIN_RUNS by default) are split over a pool of `workers` processes
+def sweep_backtests(data, runs, workers=None, parallel_min_runs=None):
+    runs = [{**DEFAULT_PARAMETERS, **parameters} for parameters in runs]
+    workers = BACKTEST_WORKERS if workers is None else workers
+    parallel_min_runs = PARALLEL_MIN_RUNS if parallel_min_runs is None else parallel_min_runs
+    if workers > 1 and len(runs) >= parallel_min_runs:
+        # Spawned workers, as sweeps may be started from the dashboard's cache warmer thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_sweep_worker, initargs=(data,)) as pool:
+            rows = list(pool.map(_sweep_worker_run, runs, chunksize=max(len(runs) // (workers * 4), 1)))
+    else:
+        rows = [_sweep_run(data, parameters) for parameters in runs]
+    return pd.DataFrame(rows)
+
+# Every combination of the values of `grid` (argument -> list of values), for sweep_backtests
+def parameter_grid(**grid):
+    index = pd.MultiIndex.from_product(list(grid.values()), names=list(grid))
+    return [dict(zip(index.names, values)) for values in index]
@@ -0,0 +1,250 @@
+# Cached data access for the dashboard pages, on top of the analytics core (utils/core.py).
+# Every query and derived frame is cached per version of the tables it reads (see
+# version_key), so a reload of some tables is picked up under new cache keys, only for the data
+# reading them, which can be warmed before the pages switch over to them (see utils/warmup.py). The pages only call the public functions.
+import re
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+from utils import backtest, core, factors, profiling, queries, streaming
+from utils.analytics import roll_up_industry_margins
+from utils.risk import ROLLING_WINDOW, calculate_risk_metrics
+from utils.db import get_engine
+from utils.frames import FRAME_SCHEMAS, build_typed_frame
+
+# Versions the pages read from ({table: load version}). Set by the cache warmer when it starts, and
+# then whenever new versions are warm. Until then every call reads them from data_loads
+_published_versions = None
+
+# Latest load of every table recorded by data/loader.py in the data_loads table (empty when nothing was recorded yet)
+def get_loaded_versions():
+    try:
+        with get_engine().connect() as conn:
+            return dict(conn.execute(text(queries.TABLE_VERSIONS)).all())
+    except ProgrammingError:
+        return {}
+
+def publish_versions(versions):
+    global _published_versions
+    _published_versions = versions
+
+def current_versions():
+    if _published_versions is None:
+        return get_loaded_versions()
+    return _published_versions
+
+# Cache key of data read by the queries `names` (see queries.QUERY_TABLES): the load version of
+# every table they read. `versions` is a versions dict or another cache key
+def version_key(versions, *names):
+    versions = dict(versions)
+    tables = sorted({table for name in names for table in queries.QUERY_TABLES[name]})
+    return tuple((table, versions.get(table, 0)) for table in tables)
+
+# Cache key of the current data of the queries `names`, for the charts cached by utils/figures.py
+def chart_version(*names):
+    return version_key(current_versions(), *names)
+
+# Queries behind the factor regressions and the return attribution
+FACTOR_QUERIES = ("screener_stocks", "esg_score_history", "esg_risk")
+
+# Queries behind the risk metrics of a benchmark
+def risk_queries(benchmark):
+    return ("esg_risk", "screener_stocks") if benchmark == 'industry' else ("esg_risk",)
+
+# Queries that are only read through streamed aggregations (see utils/streaming.py), never as a whole frame
+STREAMED_QUERIES = ("esg_risk", "pricing_industry_bars")
+
+# Large query results are streamed and converted to compact typed frames chunk by chunk (see utils/frames.py)
+@st.cache_data(max_entries=32, show_spinner=False)
+def _load_query(name, version):
+    if name in FRAME_SCHEMAS:
+        return streaming.read_typed_chunks(profiling.stream_sql(name, queries.NAMED_QUERIES[name], get_engine()), name)
+    return profiling.read_sql(name, queries.NAMED_QUERIES[name], get_engine())
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_market_data(version):
+    df_market = _load_query("esg_market", version_key(version, "esg_market"))
+    with profiling.span("transform", "prepare_market_data"):
+        return core.market_data(df_market)
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_sharpe_ratios(version):
+    chunks = profiling.stream_sql("esg_risk_by_ticker", queries.ESG_RISK_BY_TICKER, get_engine())
+    with profiling.span("transform", "stream_sharpe_ratios"):
+        return streaming.stream_sharpe_ratios(chunks)
+
+# Date x ticker closing prices of the risk query, shared by the risk metrics
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_risk_prices(version):
+    chunks = profiling.stream_sql("esg_risk", queries.ESG_RISK, get_engine())
+    with profiling.span("transform", "stream_price_matrix:esg_risk"):
+        return streaming.stream_price_matrix(chunks)
+
+# Industry of every ticker, for betas against the industry indexes
+def _industries(version):
+    return core.ticker_industries(_load_query("screener_stocks", version_key(version, "screener_stocks")))
+
+# benchmark is 'market' (equal-weight index of all tickers) or 'industry'
+@st.cache_data(max_entries=4, show_spinner=False)
+def _load_risk_metrics(benchmark, version):
+    industries = _industries(version) if benchmark == 'industry' else None
+    price_matrix = _load_risk_prices(version_key(version, "esg_risk"))
+    with profiling.span("transform", f"calculate_risk_metrics:{benchmark}"):
+        return calculate_risk_metrics(price_matrix, industries)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_rolling_risk(ticker, benchmark, window, version):
+    industries = _industries(version) if benchmark == 'industry' else None
+    price_matrix = _load_risk_prices(version_key(version, "esg_risk"))
+    with profiling.span("transform", "rolling_risk_metrics"):
+        return core.rolling_risk(price_matrix, ticker, industries, window)
+
+# Rolling cross-sectional regressions of returns on the ESG pillars, size and industry, as of
+# the start of every window
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_factor_regressions(window, version):
+    stocks = _load_query("screener_stocks", version_key(version, "screener_stocks"))
+    history = _load_query("esg_score_history", version_key(version, "esg_score_history"))
+    price_matrix = _load_risk_prices(version_key(version, "esg_risk"))
+    with profiling.span("transform", f"rolling_factor_regressions:{window}"):
+        return factors.rolling_factor_regressions(price_matrix, stocks, history, window)
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_return_attribution(version):
+    stocks = _load_query("screener_stocks", version_key(version, "screener_stocks"))
+    history = _load_query("esg_score_history", version_key(version, "esg_score_history"))
+    price_matrix = _load_risk_prices(version_key(version, "esg_risk"))
+    with profiling.span("transform", "return_attribution"):
+        return factors.return_attribution(price_matrix, stocks, history)
+
+# Aligned prices and scores of the backtests. They are read-only, so one instance per version is shared by all sessions
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_backtest_data(version):
+    history = _load_query("esg_score_history", version_key(version, "esg_score_history"))
+    price_matrix = _load_risk_prices(version_key(version, "esg_risk"))
+    with profiling.span("transform", "align_backtest_data"):
+        return backtest.BacktestData(price_matrix, history)
+
+# `parameters` are the backtest() arguments as sorted (name, value) pairs, so they can be hashed
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_backtest(parameters, version):
+    backtest_data = _load_backtest_data(version_key(version, "esg_score_history", "esg_risk"))
+    with profiling.span("transform", "backtest"):
+        return backtest.backtest(backtest_data, **dict(parameters))
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _load_backtest_sweep(runs, version):
+    backtest_data = _load_backtest_data(version_key(version, "esg_score_history", "esg_risk"))
+    with profiling.span("transform", f"sweep_backtests:{len(runs)}"):
+        return backtest.sweep_backtests(backtest_data, [dict(parameters) for parameters in runs])
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_daily_industry_margins(version):
+    chunks = profiling.stream_sql("pricing_industry_bars", queries.PRICING_INDUSTRY_BARS, get_engine())
+    with profiling.span("transform", "stream_daily_industry_margins"):
+        return streaming.stream_daily_industry_margins(chunks)
+
+# Each frequency is rolled up from the cached daily margins, never from the raw bars
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_industry_margins(frequency, version):
+    daily = _load_daily_industry_margins(version_key(version, "pricing_industry_bars"))
+    with profiling.span("transform", f"roll_up_industry_margins:{frequency}"):
+        return roll_up_industry_margins(daily, frequency)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _load_esg_kpis(industry, version):
+    return profiling.read_sql("home_esg_kpis", text(queries.HOME_ESG_KPIS), get_engine(), params={'industry': industry}, index_col='pillar')
+
+# The screener and its indexes are read-only, so one instance per version is shared by all sessions
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_stock_screener(version):
+    stocks = _load_query("screener_stocks", version_key(version, "screener_stocks"))
+    sharpe_ratios = _load_sharpe_ratios(version_key(version, "esg_risk"))
+    with profiling.span("transform", "build_screener_indexes"):
+        return core.stock_screener(stocks, sharpe_ratios)
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def _search_stocks(tsquery, limit, version):
+    return profiling.read_sql("search_stocks", text(queries.SEARCH_STOCKS), get_engine(), params={"query": tsquery, "limit": limit})
+
+# Turns free text into a tsquery matching all words, with the last word as a prefix for typeahead
+# ("EV batt" -> "ev & batt:*"). Returns None when the text has no words
+def build_search_tsquery(search_text):
+    words = re.findall(r"\w+", search_text.lower())
+    if not words:
+        return None
+    return " & ".join([*words[:-1], f"{words[-1]}:*"])
+
+# Closing prices of a batch of tickers, fetched with a single query
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_close_history(tickers, years, version):
+    df = profiling.read_sql("pricing_close_history", core.close_history_sql(), get_engine(), params={"tickers": list(tickers), "years": years})
+    return build_typed_frame(df, "close_history")
+
+def load_query(name):
+    return _load_query(name, version_key(current_versions(), name))
+
+# Market data of esg.py, with numeric columns and annual returns
+def load_market_data():
+    return _load_market_data(version_key(current_versions(), "esg_market"))
+
+# Annualized returns, volatility and Sharpe ratio per company
+def load_sharpe_ratios():
+    return _load_sharpe_ratios(version_key(current_versions(), "esg_risk"))
+
+# Average daily margin per industry and period of the frequency ('Daily' ... 'Quarterly')
+def load_industry_margins(frequency='Quarterly'):
+    return _load_industry_margins(frequency, version_key(current_versions(), "pricing_industry_bars"))
+
+# Risk metrics of every ticker, with betas against the market or the ticker's industry
+def load_risk_metrics(benchmark='market'):
+    return _load_risk_metrics(benchmark, version_key(current_versions(), *risk_queries(benchmark)))
+
+# Rolling volatility, Sharpe ratio and beta of one ticker, indexed by date
+def load_rolling_risk(ticker, benchmark='market', window=ROLLING_WINDOW):
+    return _load_rolling_risk(ticker, benchmark, window, version_key(current_versions(), *risk_queries(benchmark)))
+
+# Factor regressions of every `window`-day window (see utils/factors.py), one row per window end and factor
+def load_factor_regressions(window):
+    return _load_factor_regressions(window, version_key(current_versions(), *FACTOR_QUERIES))
+
+# Full-history factor coefficients and the split of every company's return into factor contributions
+def load_return_attribution():
+    return _load_return_attribution(version_key(current_versions(), *FACTOR_QUERIES))
+
+# Backtest of an ESG strategy against the equal-weight universe (see utils/backtest.py), with
+# the arguments of backtest.backtest() (the missing ones from backtest.DEFAULT_PARAMETERS)
+def load_backtest(**parameters):
+    parameters = tuple(sorted({**backtest.DEFAULT_PARAMETERS, **parameters}.items()))
+    return _load_backtest(parameters, version_key(current_versions(), "esg_score_history", "esg_risk"))
+
+# Strategy metrics of every parameter set of `runs` (see backtest.sweep_backtests), one row per run
+def load_backtest_sweep(runs):
+    runs = tuple(tuple(sorted({**backtest.DEFAULT_PARAMETERS, **parameters}.items())) for parameters in runs)
+    return _load_backtest_sweep(runs, version_key(current_versions(), "esg_score_history", "esg_risk"))
+
+# Headline ESG KPIs of the home page, for all stocks ('All') or one industry
+def load_esg_kpis(industry='All'):
+    return _load_esg_kpis(industry, version_key(current_versions(), "home_esg_kpis"))
+
+# Tickers and names ranked by how well they match the search text
+def search_stocks(search_text, limit=20):
+    tsquery = build_search_tsquery(search_text)
+    if tsquery is None:
+        return pd.DataFrame(columns=["ticker_symbol", "name", "industry", "rank"])
+    return _search_stocks(tsquery, limit, version_key(current_versions(), "search_stocks"))
+
+# Indexed per-ticker feature table for the screener page
+def load_stock_screener():
+    return _load_stock_screener(version_key(current_versions(), "screener_stocks", "esg_risk"))
+
+# Closing prices of `tickers`. The tickers are sorted so every selection order shares a cache entry
+# years=None reads the whole history
+def load_close_history(tickers, years=None):
+    return _load_close_history(tuple(sorted(tickers)), years, version_key(current_versions(), "pricing_close_history"))
+
+def load_kpi_industries():
+    return load_query("home_kpi_industries")['industry'].tolist()
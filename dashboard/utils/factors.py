@@ -0,0 +1,217 @@
+# Cross-sectional factor regressions of returns on ESG pillar scores, size and industry.
+# Every window regresses the annualized log return of all tickers on their exposures as of the
+# start of the window: the environment, social and governance scores published by then and the
+# log market cap then (z-scored across tickers), plus industry dummies. Exposures known only
+# later (today's market cap already contains the window's return) would bias the coefficients.
+# The normal equations of all windows are built with batched matrix products and solved
+# together with a batched pseudo-inverse, so hundreds of windows cost about as much as a
+# handful of single fits.
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import TRADING_DAYS, published_scores
+from utils.risk import log_return_matrix
+
+# Exposures whose coefficients are reported, with their labels. Industry dummies are controls
+FACTOR_LABELS = {
+    'intercept': 'Intercept',
+    'environment_score': 'Environment',
+    'social_score': 'Social',
+    'governance_score': 'Governance',
+    'size': 'Size (log market cap)',
+}
+PILLARS = ['environment_score', 'social_score', 'governance_score']
+# Rolling window lengths in trading days
+FACTOR_WINDOWS = {'1 month': 21, '1 quarter': 63, '1 year': 252}
+# Trading days between the ends of consecutive windows
+FACTOR_STEP = 21
+# Share of a window's days a ticker needs returns on to be part of that window's regression
+MIN_COVERAGE = 0.8
+
+# Aligned inputs of the regressions: the forward-filled prices (date x ticker), the scores as of
+# every publication date (the esg_score_history query), the latest market cap and the industry
+# dummies of every ticker (the screener_stocks query). The first industry is the baseline
+class FactorData:
+    def __init__(self, price_matrix, stocks, score_history):
+        self.dates = pd.DatetimeIndex(price_matrix.index)
+        self.tickers = price_matrix.columns.astype(str)
+        self.prices = pd.DataFrame(price_matrix.to_numpy(dtype=np.float64)).ffill().to_numpy()
+        self.score_dates, self.scores = published_scores(score_history, self.tickers, PILLARS)
+
+        stocks = stocks.set_index(stocks['ticker_symbol'].astype(str)).reindex(self.tickers)
+        market_cap = pd.to_numeric(stocks['market_cap'], errors='coerce').to_numpy(dtype=np.float64)
+        # Market cap per unit of the latest close, so the market cap on a date is this times its close
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.shares = np.where(market_cap > 0, market_cap / self.prices[-1], np.nan)
+        # Tickers without an industry (or not in the query at all) get NaN dummies
+        industries = pd.get_dummies(stocks['industry'], prefix='industry', drop_first=True, dtype=np.float64)
+        self.industries = np.where(stocks['industry'].notna().to_numpy()[:, None], industries.to_numpy(), np.nan)
+        self.columns = [*FACTOR_LABELS, *industries.columns]
+
+    # Exposures (window x ticker x exposure) as of the price rows `positions`: one row per window
+    # (window), or one row per window and ticker (window x ticker). NaN for tickers without a
+    # price, a market cap or a published score then. Scores and size are not z-scored yet
+    def exposures_at(self, positions):
+        positions = np.asarray(positions)
+        positions = np.broadcast_to(positions.reshape(len(positions), -1), (len(positions), len(self.tickers)))
+        columns = np.arange(len(self.tickers))
+        # Latest publication of every window and ticker, the way BacktestData.scores_at looks it up
+        rows = np.searchsorted(self.score_dates.to_numpy(), self.dates.to_numpy()[positions], side='right') - 1
+        exposures = np.empty((*positions.shape, len(self.columns)))
+        exposures[:, :, 0] = 1.0
+        for k, pillar in enumerate(PILLARS, start=1):
+            exposures[:, :, k] = np.where(rows >= 0, self.scores[pillar][np.maximum(rows, 0), columns], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            exposures[:, :, 4] = np.log(self.shares * self.prices[positions, columns])
+        exposures[:, :, 5:] = self.industries
+        return exposures
+
+    # Price row of every ticker's first published score (the first date on or after it), 0 for
+    # tickers without scores
+    def first_score_positions(self):
+        published = np.isfinite(self.scores[PILLARS[0]])
+        first = np.where(published.any(axis=0), published.argmax(axis=0), 0)
+        positions = self.dates.searchsorted(self.score_dates[first]) if len(self.score_dates) else np.zeros(len(self.tickers), dtype=int)
+        return np.minimum(positions, len(self.dates) - 1)
+
+# Z-scores the scores and size of every window (window x ticker x exposure) across the tickers
+# that take part in it (`valid`, window x ticker). Other tickers get NaN exposures
+def standardize_exposures(exposures, valid):
+    exposures = np.where(valid[:, :, None], exposures, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # Windows without tickers have no mean
+        warnings.simplefilter('ignore', RuntimeWarning)
+        block = exposures[:, :, 1:5]
+        exposures[:, :, 1:5] = (block - np.nanmean(block, axis=1, keepdims=True)) / np.nanstd(block, axis=1, ddof=1, keepdims=True)
+    return exposures
+
+# Annualized log return of every ticker over every window of `window` days, ending every
+# `step` days (the last window ends on the last date). Returns the window end positions and a
+# ticker x window matrix, NaN where a ticker has returns on less than MIN_COVERAGE of the days
+def window_returns(returns, window, step=FACTOR_STEP):
+    valid = np.isfinite(returns)
+    sums = np.vstack([np.zeros(returns.shape[1]), np.cumsum(np.where(valid, returns, 0.0), axis=0)])
+    counts = np.vstack([np.zeros(returns.shape[1]), np.cumsum(valid, axis=0)])
+    ends = np.arange(len(returns), window - 1, -step)[::-1]
+    window_sums = sums[ends] - sums[ends - window]
+    window_counts = counts[ends] - counts[ends - window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        annualized = np.where(window_counts >= MIN_COVERAGE * window, window_sums / window_counts * TRADING_DAYS, np.nan)
+    return ends - 1, annualized.T
+
+# Least squares fits of every column of Y (ticker x window) on the exposures X of that window
+# (window x ticker x k, or ticker x k shared by all windows), each over the tickers with a value
+# in that column and finite exposures. Returns the coefficients and t-statistics (window x k),
+# and the R squared and number of tickers of every window
+def batched_least_squares(X, Y):
+    if X.ndim == 2:
+        X = np.broadcast_to(X, (Y.shape[1], *X.shape))
+    mask = np.isfinite(Y) & np.isfinite(X).all(axis=2).T
+    y = np.where(mask, Y, 0.0)
+    X = np.where(mask.T[:, :, None], X, 0.0)
+
+    # X'X and X'y of every window, from batched matrix products (excluded tickers are zero rows)
+    xtx = np.matmul(X.transpose(0, 2, 1), X)
+    xty = np.einsum('nw,wnk->wk', y, X)
+    yty = np.einsum('nw,nw->w', y, y)
+    n = mask.sum(axis=0).astype(np.float64)
+
+    xtx_inverse = np.linalg.pinv(xtx, hermitian=True)
+    coefficients = np.einsum('wkl,wl->wk', xtx_inverse, xty)
+    rank = np.linalg.matrix_rank(xtx, hermitian=True)
+    residual_ss = yty - 2 * np.einsum('wk,wk->w', coefficients, xty) + np.einsum('wk,wkl,wl->w', coefficients, xtx, coefficients)
+    total_ss = yty - y.sum(axis=0) ** 2 / np.maximum(n, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        residual_variance = np.maximum(residual_ss, 0.0) / (n - rank)
+        standard_errors = np.sqrt(residual_variance[:, None] * np.diagonal(xtx_inverse, axis1=1, axis2=2))
+        t_stats = coefficients / standard_errors
+        r_squared = 1 - residual_ss / total_ss
+    # Windows with fewer tickers than exposures can't be fitted
+    fitted = n > rank
+    coefficients[~fitted], t_stats[~fitted], r_squared[~fitted] = np.nan, np.nan, np.nan
+    return coefficients, t_stats, r_squared, n
+
+# Regressions of the annualized returns (ticker x window) of windows starting at the price rows
+# `starts` on the exposures as of those rows
+def _regress(data, starts, returns):
+    exposures = data.exposures_at(starts)
+    valid = np.isfinite(returns.T) & np.isfinite(exposures).all(axis=2)
+    exposures = standardize_exposures(exposures, valid)
+    return exposures, batched_least_squares(exposures, returns)
+
+# Rolling cross-sectional regressions over a price matrix (date x ticker) for windows of
+# `window` days. Returns one row per window end and reported factor, with the coefficient
+# (annualized return per standard deviation of the exposure), its t-statistic, the R squared
+# and the number of tickers of the window
+def rolling_factor_regressions(price_matrix, stocks, score_history, window, step=FACTOR_STEP):
+    data = FactorData(price_matrix, stocks, score_history)
+    ends, returns = window_returns(log_return_matrix(data.prices), window, step)
+    # A window's first return is the move from the close the day before, its exposures are as of that close
+    _, (coefficients, t_stats, r_squared, n) = _regress(data, np.maximum(ends - window, 0), returns)
+
+    factors = list(FACTOR_LABELS)
+    dates = data.dates[ends]
+    return pd.DataFrame({
+        'window_end': np.repeat(dates, len(factors)),
+        'factor': np.tile(factors, len(dates)),
+        'coefficient': coefficients[:, :len(factors)].ravel(),
+        't_stat': t_stats[:, :len(factors)].ravel(),
+        'r_squared': np.repeat(r_squared, len(factors)),
+        'tickers': np.repeat(n.astype(int), len(factors)),
+    })
+
+# Fama-MacBeth summary of rolling regressions: the mean coefficient of every factor, its
+# t-statistic over the windows and the share of windows with a positive coefficient. Only
+# non-overlapping windows are used, so the windows are independent samples
+def fama_macbeth_summary(regressions, window, step=FACTOR_STEP):
+    window_ends = np.sort(regressions['window_end'].unique())
+    independent = window_ends[::-1][::int(np.ceil(window / step))]
+    coefficients = regressions[regressions['window_end'].isin(independent)].pivot(index='window_end', columns='factor', values='coefficient')
+    coefficients = coefficients.dropna()
+    summary = pd.DataFrame({
+        'mean_coefficient': coefficients.mean(),
+        't_stat': coefficients.mean() / (coefficients.std() / np.sqrt(len(coefficients))),
+        'positive_share': (coefficients > 0).mean(),
+        'windows': len(coefficients),
+    })
+    return summary.reindex(list(FACTOR_LABELS)).rename_axis('factor').reset_index()
+
+# Regression of the annualized mean log return of every ticker since its first published score
+# on its exposures as of that date (scores are published at different dates, a common start
+# would leave out most tickers), and the split of every ticker's return into the contribution
+# of each factor (coefficient x exposure), its industry, and the unexplained residual. Returns
+# the coefficients (with t-statistics), the contributions per ticker of the regression, which add
+# up to the ticker's return, the R squared and the number of tickers
+def return_attribution(price_matrix, stocks, score_history):
+    data = FactorData(price_matrix, stocks, score_history)
+    starts = data.first_score_positions()
+    returns = log_return_matrix(data.prices)
+    valid = np.isfinite(returns)
+    sums = np.vstack([np.zeros(returns.shape[1]), np.cumsum(np.where(valid, returns, 0.0), axis=0)])
+    counts = np.vstack([np.zeros(returns.shape[1]), np.cumsum(valid, axis=0)])
+    # Returns after the start row of every ticker, which needs MIN_COVERAGE of those days
+    columns = np.arange(len(data.tickers))
+    ticker_sums = sums[-1] - sums[starts + 1, columns]
+    ticker_counts = counts[-1] - counts[starts + 1, columns]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        annual_returns = np.where(
+            (ticker_counts > 0) & (ticker_counts >= MIN_COVERAGE * (len(returns) - 1 - starts)),
+            ticker_sums / ticker_counts * TRADING_DAYS, np.nan,
+        )[:, None]
+    exposures, (coefficients, t_stats, r_squared, n) = _regress(data, starts[None, :], annual_returns)
+
+    contributions = pd.DataFrame(exposures[0] * coefficients[0], index=data.tickers.rename('ticker_symbol'), columns=data.columns)
+    industry_columns = data.columns[len(FACTOR_LABELS):]
+    attribution = contributions[list(FACTOR_LABELS)].assign(industry=contributions[industry_columns].sum(axis=1))
+    attribution['annualized_return'] = annual_returns[:, 0]
+    attribution['residual'] = attribution['annualized_return'] - attribution[[*FACTOR_LABELS, 'industry']].sum(axis=1)
+    attribution = attribution.dropna(subset=['annualized_return', *FACTOR_LABELS]).reset_index()
+
+    coefficient_table = pd.DataFrame({
+        'factor': list(FACTOR_LABELS),
+        'coefficient': coefficients[0, :len(FACTOR_LABELS)],
+        't_stat': t_stats[0, :len(FACTOR_LABELS)],
+    })
+    return {'coefficients': coefficient_table, 'attribution': attribution, 'r_squared': float(r_squared[0]), 'tickers': int(n[0])}
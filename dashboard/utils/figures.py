@@ -0,0 +1,27 @@
+# Cache of built Plotly figures.
+# The charts of the ESG page are rebuilt from their data frames on every rerun, even when
+# nothing they show has changed. Charts drawn with plotly_chart() below are built once per
+# (chart id, data version, selection) and kept as figure objects with st.cache_resource, shared
+# by all sessions, so a rerun neither rebuilds nor validates them. st.plotly_chart still copies
+# the figure to a dict and serializes it to JSON on every rerun (about 1 ms per
+# thousand points). The cache keeps the DASHBOARD_FIGURE_CACHE_ENTRIES most recently used figures.
+import os
+
+import streamlit as st
+
+from utils import profiling
+
+FIGURE_CACHE_ENTRIES = int(os.getenv("DASHBOARD_FIGURE_CACHE_ENTRIES", "256"))
+
+# Figure of chart `chart_id`, built with `_build()` on a cache miss. `version` is the cache key
+# of the data the chart shows (see data.chart_version) and `selection` every widget value the
+# figure depends on. `_build` is not part of the key. The figure is shared and must not be changed
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def cached_figure(chart_id, version, selection, _build):
+    with profiling.span("chart_build", chart_id):
+        return _build()
+
+# Draws a cached chart like st.plotly_chart(fig, width="stretch"), without building the
+# figure when it is cached
+def plotly_chart(chart_id, version, selection, build):
+    st.plotly_chart(cached_figure(chart_id, version, selection, build), width="stretch")
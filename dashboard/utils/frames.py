@@ -0,0 +1,92 @@
+# Compact, typed in-memory representation of the dashboard DataFrames.
+# The database stores every column as TEXT, so query results arrive as object columns with
+# the same ticker, name and industry strings repeated on every daily row. The typed-frame
+# builder turns repeated strings into categoricals, floats into float32 where that keeps the
+# precision of the column, and dates into int32 day numbers (or datetime64 for frames that
+# still go through date arithmetic).
+import numpy as np
+import pandas as pd
+
+# Integer-coded dates count the days since this date
+DATE_EPOCH = pd.Timestamp("1970-01-01")
+
+# Schemas of the frames the dashboard keeps in memory. Floats map to the number of decimals
+# that must survive the conversion to float32 (prices to the cent), otherwise the column
+# stays float64
+FRAME_SCHEMAS = {
+    "esg_market": {
+        "categories": ["name", "ticker_symbol", "industry"],
+        "floats": {"total_score": 0, "market_cap": 0, "close": 2},
+        "datetimes": ["date"],
+    },
+    "esg_risk": {
+        "categories": ["ticker_symbol", "name"],
+        "floats": {"total_esg_score": 0, "close": 2},
+        "datetimes": ["date"],
+    },
+    "pricing_industry_bars": {
+        "categories": ["ticker_symbol", "industry"],
+        "floats": {"open": 2, "close": 2},
+        "datetimes": ["date"],
+    },
+    "close_history": {
+        "categories": ["ticker_symbol"],
+        "floats": {"close": 2},
+        "datetimes": ["date"],
+    },
+    "market_data": {
+        "categories": ["name", "ticker_symbol", "industry"],
+        "floats": {"total_score": 0, "market_cap": 0, "close": 2, "annual_total_return_percentage": 2},
+        "integers": ["year"],
+        "dates": ["date"],
+    },
+}
+
+# Converts dates to int32 day numbers since DATE_EPOCH
+def encode_dates(values):
+    dates = pd.to_datetime(values, errors="coerce")
+    return ((dates - DATE_EPOCH) // pd.Timedelta(days=1)).astype("Int32" if dates.isna().any() else "int32")
+
+# Converts int32 day numbers back to datetimes
+def decode_dates(codes):
+    return DATE_EPOCH + pd.to_timedelta(codes, unit="D")
+
+# True when every value of the column survives the conversion to float32 at `decimals` decimals
+def fits_float32(values, decimals):
+    finite = values[np.isfinite(values)]
+    return bool(np.all(np.abs(finite.astype(np.float32).astype(np.float64) - finite) <= 0.5 * 10.0 ** -decimals))
+
+# Builds the typed frame for `schema` (a name from FRAME_SCHEMAS or a schema dict).
+# Columns that are not part of the schema are left as they are
+def build_typed_frame(df, schema):
+    if isinstance(schema, str):
+        schema = FRAME_SCHEMAS[schema]
+    df = df.copy()
+    for column in schema.get("categories", []):
+        if column in df:
+            df[column] = df[column].astype("category")
+    for column, decimals in schema.get("floats", {}).items():
+        if column in df:
+            values = pd.to_numeric(df[column], errors="coerce").astype(np.float64)
+            df[column] = values.astype(np.float32) if fits_float32(values.to_numpy(), decimals) else values
+    for column in schema.get("integers", []):
+        if column in df:
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+    for column in schema.get("datetimes", []):
+        if column in df:
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+    for column in schema.get("dates", []):
+        if column in df:
+            df[column] = encode_dates(df[column])
+    return df
+
+# Deep memory use of a frame in bytes
+def frame_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+# Rows and memory use per frame, e.g. memory_report({"df_market": df_market})
+def memory_report(frames):
+    return pd.DataFrame([
+        {"frame": name, "rows": len(df), "memory_mb": round(frame_memory(df) / 1e6, 2)}
+        for name, df in frames.items()
+    ])
@@ -0,0 +1,86 @@
+# Persistent response cache for the provider APIs (Finnhub, FMP).
+# Every provider call goes through cached_call with an endpoint name and its (non-secret)
+# parameters. Responses are stored as JSON files under PROVIDER_CACHE_DIR, one per endpoint and
+# parameter set, and reused until the endpoint's TTL runs out. PROVIDER_CACHE_MODE selects:
+# - "record" (default): serve fresh cached responses, call the provider and store otherwise
+# - "replay": only serve stored responses, regardless of their age, and never touch the network.
+#   Pointing PROVIDER_CACHE_DIR at a directory of recorded fixtures runs everything offline
+# - "archive": serve the latest response of the raw archive (see utils/raw_archive.py), regardless
+#   of its age, and never touch the network. Re-runs the transform over everything ever fetched
+# - "off": always call the provider and store nothing
+# Calls with archive=True also append every response they get from a provider to the raw archive
+import hashlib
+import json
+import os
+import time
+
+from utils import raw_archive
+
+PROVIDER_CACHE_DIR = os.getenv(
+    "PROVIDER_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".provider_cache")
+)
+PROVIDER_CACHE_MODE = os.getenv("PROVIDER_CACHE_MODE", "record")
+
+# Seconds a response stays fresh, per endpoint
+ENDPOINT_TTLS = {
+    "finnhub.company_profile2": 7 * 24 * 3600,
+    "fmp.company_profile": 7 * 24 * 3600,
+    "fmp.historical_price_full": 24 * 3600,
+    "finnhub.recommendation_trends": 24 * 3600,
+    "finnhub.news": 15 * 60,
+}
+DEFAULT_TTL = 24 * 3600
+
+# Number of responses served from the cache and from the providers in this process
+call_stats = {"cached": 0, "live": 0}
+
+def cache_path(endpoint, params, cache_dir=None):
+    key = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return os.path.join(cache_dir or PROVIDER_CACHE_DIR, endpoint, f"{key}.json")
+
+def read_response(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+# Writes to a temporary file first, so concurrent readers never see half a response
+def write_response(path, endpoint, params, response):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"endpoint": endpoint, "params": params, "recorded_at": time.time(), "response": response}, f, default=str)
+    os.replace(tmp_path, path)
+
+# Returns the response of `fetch` (a function without arguments calling the provider) for the
+# endpoint and parameters, from the cache when possible. API keys must not be part of `params`
+def cached_call(endpoint, params, fetch, mode=None, cache_dir=None, archive=False):
+    mode = mode or PROVIDER_CACHE_MODE
+    if mode == "archive":
+        response = raw_archive.lookup(endpoint, params)
+        call_stats["cached"] += 1
+        return response
+    if mode == "off":
+        response = fetch()
+        call_stats["live"] += 1
+        if archive:
+            raw_archive.append_response(endpoint, params, response)
+        return response
+
+    path = cache_path(endpoint, params, cache_dir)
+    entry = read_response(path)
+    if entry is not None:
+        age = time.time() - entry["recorded_at"]
+        if mode == "replay" or age < ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL):
+            call_stats["cached"] += 1
+            return entry["response"]
+    if mode == "replay":
+        raise LookupError(f"No recorded response for {endpoint} {params} in {cache_dir or PROVIDER_CACHE_DIR}")
+
+    response = fetch()
+    call_stats["live"] += 1
+    write_response(path, endpoint, params, response)
+    if archive:
+        raw_archive.append_response(endpoint, params, response)
+    return response
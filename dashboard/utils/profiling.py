@@ -0,0 +1,212 @@
+# Opt-in instrumentation for the dashboard pages.
+# Enable it with the DASHBOARD_PROFILING=1 environment variable, or per session by opening
+# the app with ?debug=1. When enabled, every rerun records a timing span for each query,
+# transform and chart build (with rows returned and the traced memory delta), the results
+# show up in a debug panel in the sidebar and can be exported as JSON or Prometheus text.
+# When disabled, spans are no-ops.
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+from utils.frames import memory_report
+from utils.streaming import stream_query
+
+PROFILING_ENABLED = os.getenv("DASHBOARD_PROFILING", "").lower() in ("1", "true", "yes")
+
+# Session state keys
+SPANS_KEY = "profiling_spans"
+PAGE_KEY = "profiling_page"
+CPROFILE_REQUEST_KEY = "profiling_cprofile_requested"
+CPROFILE_RESULT_KEY = "profiling_cprofile_result"
+FRAMES_KEY = "profiling_frames"
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    seconds: float = 0.0
+    rows: int = None
+    memory_delta_bytes: int = None
+
+# Process wide totals per (page, kind, name), shared by all sessions for the Prometheus export
+_totals = {}
+_totals_lock = threading.Lock()
+
+# Profiled reruns in progress. tracemalloc traces every allocation of the process, so it only
+# runs while at least one of them is, and isn't stopped when it was started outside this module
+_traced_runs = 0
+_started_tracing = False
+_tracing_lock = threading.Lock()
+
+def is_enabled():
+    return PROFILING_ENABLED or st.query_params.get("debug") == "1"
+
+# Records one span of the current rerun. Yields a Span so callers can fill in `rows`
+@contextmanager
+def span(kind, name):
+    spans = st.session_state.get(SPANS_KEY)
+    record = Span(kind, name)
+    if spans is None:
+        yield record
+        return
+
+    tracing = tracemalloc.is_tracing()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        if tracing:
+            record.memory_delta_bytes = tracemalloc.get_traced_memory()[0] - memory_before
+        spans.append(record)
+        _add_to_totals(st.session_state.get(PAGE_KEY, ""), record)
+
+def _add_to_totals(page, record):
+    with _totals_lock:
+        totals = _totals.setdefault((page, record.kind, record.name), {"count": 0, "seconds": 0.0, "rows": 0})
+        totals["count"] += 1
+        totals["seconds"] += record.seconds
+        totals["rows"] += record.rows or 0
+
+# Records the rows and memory use of a DataFrame the page keeps during the rerun
+def record_frame(name, df):
+    frames = st.session_state.get(FRAMES_KEY)
+    if frames is not None:
+        frames[name] = df
+
+# Runs a query with pandas inside a "sql" span and records the number of rows returned
+def read_sql(name, sql, engine, **kwargs):
+    with span("sql", name) as record:
+        df = pd.read_sql_query(sql, engine, **kwargs)
+        record.rows = len(df)
+    return df
+
+# Streams a query in chunks (see utils/streaming.py) inside a "sql" span, which ends with the
+# number of rows read once the last chunk has been consumed
+def stream_sql(name, sql, engine, **kwargs):
+    with span("sql", name) as record:
+        record.rows = 0
+        for chunk in stream_query(sql, engine, **kwargs):
+            record.rows += len(chunk)
+            yield chunk
+
+# Traces memory allocations during a profiled rerun. Tracing stops once the last profiled rerun
+# of any session has finished
+@contextmanager
+def _traced_run():
+    global _traced_runs, _started_tracing
+    with _tracing_lock:
+        if _traced_runs == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _traced_runs += 1
+    try:
+        yield
+    finally:
+        with _tracing_lock:
+            _traced_runs -= 1
+            if _traced_runs == 0 and _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+
+# Wraps a full page run. Starts a fresh list of spans for this rerun and, when requested
+# from the debug panel, profiles the rerun with cProfile.
+@contextmanager
+def page_run(page):
+    if not is_enabled():
+        st.session_state.pop(SPANS_KEY, None)
+        st.session_state.pop(FRAMES_KEY, None)
+        yield
+        return
+
+    st.session_state[SPANS_KEY] = []
+    st.session_state[FRAMES_KEY] = {}
+    st.session_state[PAGE_KEY] = page
+    profiler = cProfile.Profile() if st.session_state.pop(CPROFILE_REQUEST_KEY, False) else None
+
+    with _traced_run(), span("page", page):
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                output = io.StringIO()
+                pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(40)
+                st.session_state[CPROFILE_RESULT_KEY] = output.getvalue()
+
+# Spans of the current rerun as a JSON document
+def export_json():
+    return json.dumps({
+        "page": st.session_state.get(PAGE_KEY),
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "spans": [asdict(record) for record in st.session_state.get(SPANS_KEY, [])],
+    }, indent=2)
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Process wide span totals in the Prometheus text exposition format
+def export_prometheus():
+    with _totals_lock:
+        totals = dict(_totals)
+    lines = [
+        "# HELP dashboard_span_seconds Time spent in instrumented dashboard spans.",
+        "# TYPE dashboard_span_seconds summary",
+    ]
+    for (page, kind, name), values in sorted(totals.items()):
+        labels = f'page="{_escape_label(page)}",kind="{_escape_label(kind)}",name="{_escape_label(name)}"'
+        lines.append(f"dashboard_span_seconds_sum{{{labels}}} {values['seconds']:.6f}")
+        lines.append(f"dashboard_span_seconds_count{{{labels}}} {values['count']}")
+    lines += [
+        "# HELP dashboard_span_rows_total Rows returned by instrumented dashboard spans.",
+        "# TYPE dashboard_span_rows_total counter",
+    ]
+    for (page, kind, name), values in sorted(totals.items()):
+        labels = f'page="{_escape_label(page)}",kind="{_escape_label(kind)}",name="{_escape_label(name)}"'
+        lines.append(f"dashboard_span_rows_total{{{labels}}} {values['rows']}")
+    return "\n".join(lines) + "\n"
+
+# Debug panel in the sidebar with the spans of the last rerun, exports and the cProfile trigger
+def render_debug_panel():
+    spans = st.session_state.get(SPANS_KEY)
+    if spans is None:
+        return
+
+    with st.sidebar.expander(":stopwatch: Performance debug", expanded=False):
+        df = pd.DataFrame([asdict(record) for record in spans])
+        if not df.empty:
+            df["ms"] = (df.pop("seconds") * 1000).round(1)
+            df["memory_delta_mb"] = (pd.to_numeric(df.pop("memory_delta_bytes")) / 1e6).round(2)
+            st.dataframe(df, hide_index=True)
+            st.caption("Memory deltas are process wide: they include the allocations of other sessions rerunning at the same time.")
+
+        frames = st.session_state.get(FRAMES_KEY)
+        if frames:
+            st.caption("Frame memory")
+            st.dataframe(memory_report(frames), hide_index=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSON", export_json(), file_name="spans.json", mime="application/json")
+        with col2:
+            st.download_button("Prometheus", export_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+        if st.button("Profile next rerun with cProfile"):
+            st.session_state[CPROFILE_REQUEST_KEY] = True
+            st.rerun()
+        if CPROFILE_RESULT_KEY in st.session_state:
+            st.code(st.session_state[CPROFILE_RESULT_KEY], language="text")
@@ -0,0 +1,185 @@
+# Named SQL queries used by the dashboard pages.
+# Keeping them in one place lets the benchmarks (and anything else that needs to
+# warm or time them) run exactly what the pages run.
+
+# home.py - headline KPIs precomputed by data/loader.py
+HOME_ESG_KPIS = """
+SELECT pillar, companies, mean_score, max_score, p25_score, median_score, p75_score
+FROM esg_kpis
+WHERE industry = :industry
+"""
+
+HOME_KPI_INDUSTRIES = """
+SELECT DISTINCT industry FROM esg_kpis WHERE industry <> 'All' ORDER BY industry
+"""
+
+# esg.py - market data for the industry summary and scatter plots
+ESG_MARKET = """
+SELECT st.name, st.ticker_symbol, esg.total_score, st.industry, st.market_cap AS market_cap, 
+       pr.date, pr.close
+FROM stock AS st
+INNER JOIN esg_history AS esg ON st.ticker_symbol = esg.ticker_symbol
+INNER JOIN pricing_history AS pr ON st.ticker_symbol = pr.ticker_symbol
+"""
+
+# esg.py - highest pillar scores per stock
+ESG_STOCK_PILLARS = """
+SELECT 
+st.ticker_symbol, 
+st.name, 
+CAST(MAX(esg.total_score) AS numeric) AS max_esg_score,
+CAST(MAX(esg.environment_score) AS numeric) AS max_env_score,
+CAST(MAX(esg.social_score) AS numeric) AS max_social_score,
+CAST(MAX(esg.governance_score) AS numeric) AS max_governance_score
+FROM stock AS st
+INNER JOIN esg_history AS esg ON st.ticker_symbol = esg.ticker_symbol
+INNER JOIN pricing_history AS ph ON ph.ticker_symbol = st.ticker_symbol
+GROUP BY st.ticker_symbol, st.name
+"""
+
+# esg.py - highest pillar scores per industry
+ESG_INDUSTRY_PILLARS = """
+SELECT 
+st.industry, 
+CAST(MAX(esg.total_score) AS numeric) AS max_esg_score,
+CAST(MAX(esg.environment_score) AS numeric) AS max_env_score,
+CAST(MAX(esg.social_score) AS numeric) AS max_social_score,
+CAST(MAX(esg.governance_score) AS numeric) AS max_governance_score
+FROM stock AS st
+INNER JOIN esg_history AS esg ON st.ticker_symbol = esg.ticker_symbol
+GROUP BY st.industry
+"""
+
+# esg.py - closing prices and ESG scores for the Sharpe ratio section
+ESG_RISK = """
+SELECT 
+    st.ticker_symbol, 
+    st.name, 
+    CAST(esg.total_score AS numeric) AS total_esg_score,
+    ph.date, 
+    ph.close
+FROM stock AS st
+INNER JOIN esg_history AS esg ON st.ticker_symbol = esg.ticker_symbol
+INNER JOIN pricing_history AS ph ON ph.ticker_symbol = st.ticker_symbol
+"""
+
+# esg.py - the risk query ordered by ticker and date, for the streamed Sharpe ratios (utils/streaming.py)
+ESG_RISK_BY_TICKER = ESG_RISK + """ORDER BY st.ticker_symbol, ph.date
+"""
+
+# esg.py - ticker to name mapping
+STOCK_NAMES = """
+SELECT 
+    ticker_symbol, 
+    name 
+FROM stock
+"""
+
+# screener.py - per-ticker attributes and latest ESG scores for the feature table
+SCREENER_STOCKS = """
+SELECT DISTINCT ON (st.ticker_symbol)
+    st.ticker_symbol,
+    st.name,
+    st.industry,
+    st.country,
+    CAST(st.market_cap AS numeric) * 1e6 AS market_cap,
+    CAST(esg.total_score AS numeric) AS total_score,
+    CAST(esg.environment_score AS numeric) AS environment_score,
+    CAST(esg.social_score AS numeric) AS social_score,
+    CAST(esg.governance_score AS numeric) AS governance_score
+FROM stock AS st
+INNER JOIN esg_history AS esg ON st.ticker_symbol = esg.ticker_symbol
+ORDER BY st.ticker_symbol, esg.date DESC
+"""
+
+# backtest.py - every published ESG score of every stock, for the scores as of every rebalance date
+ESG_SCORE_HISTORY = """
+SELECT
+    esg.ticker_symbol,
+    st.industry,
+    esg.date,
+    CAST(esg.total_score AS numeric) AS total_score,
+    CAST(esg.environment_score AS numeric) AS environment_score,
+    CAST(esg.social_score AS numeric) AS social_score,
+    CAST(esg.governance_score AS numeric) AS governance_score
+FROM esg_history AS esg
+INNER JOIN stock AS st ON st.ticker_symbol = esg.ticker_symbol
+"""
+
+# pricing.py - stock picker and company header
+PRICING_STOCK_PROFILES = """
+SELECT 
+st.ticker_symbol, 
+st.logo,
+st.description,
+st.name 
+FROM stock AS st
+"""
+
+# pricing.py - daily bars joined with the industry, for the quarterly margins
+PRICING_INDUSTRY_BARS = """
+SELECT ph.ticker_symbol, ph.date, ph.open, ph.close, s.industry 
+FROM pricing_history ph
+JOIN stock s ON ph.ticker_symbol = s.ticker_symbol
+"""
+
+# pricing.py - ranked full-text company search over the stock_search table built by data/loader.py
+SEARCH_STOCKS = """
+SELECT ticker_symbol, name, industry, ts_rank(document, query) AS rank
+FROM stock_search, to_tsquery('english', :query) AS query
+WHERE document @@ query
+ORDER BY rank DESC, name
+LIMIT :limit
+"""
+
+# pricing.py - closing prices of a batch of tickers for the comparison mode (:tickers is expanded)
+# Only the last :years years before their latest bar are read (all of them when :years is NULL), so
+# only the matching yearly partitions of pricing_history are scanned
+PRICING_CLOSE_HISTORY = """
+SELECT ticker_symbol, date, close
+FROM pricing_history
+WHERE ticker_symbol IN :tickers
+  AND date >= COALESCE(
+      (SELECT MAX(date) FROM pricing_history WHERE ticker_symbol IN :tickers) - make_interval(years => :years),
+      '-infinity'
+  )
+"""
+
+# Latest load of every table recorded by data/loader.py, used as the cache versions of the dashboard data
+TABLE_VERSIONS = """
+SELECT loaded.table_name, MAX(version) AS version
+FROM data_loads, unnest(tables) AS loaded(table_name)
+GROUP BY loaded.table_name
+"""
+
+# Every query above that runs without parameters, by name
+NAMED_QUERIES = {
+    "home_kpi_industries": HOME_KPI_INDUSTRIES,
+    "esg_market": ESG_MARKET,
+    "esg_stock_pillars": ESG_STOCK_PILLARS,
+    "esg_industry_pillars": ESG_INDUSTRY_PILLARS,
+    "esg_risk": ESG_RISK,
+    "stock_names": STOCK_NAMES,
+    "screener_stocks": SCREENER_STOCKS,
+    "esg_score_history": ESG_SCORE_HISTORY,
+    "pricing_stock_profiles": PRICING_STOCK_PROFILES,
+    "pricing_industry_bars": PRICING_INDUSTRY_BARS,
+}
+
+# Tables read by every query above, by name. Cached results are keyed on the load versions of these tables
+QUERY_TABLES = {
+    "home_esg_kpis": ("esg_kpis",),
+    "home_kpi_industries": ("esg_kpis",),
+    "esg_market": ("stock", "esg_history", "pricing_history"),
+    "esg_stock_pillars": ("stock", "esg_history", "pricing_history"),
+    "esg_industry_pillars": ("stock", "esg_history"),
+    "esg_risk": ("stock", "esg_history", "pricing_history"),
+    "esg_risk_by_ticker": ("stock", "esg_history", "pricing_history"),
+    "stock_names": ("stock",),
+    "screener_stocks": ("stock", "esg_history"),
+    "esg_score_history": ("stock", "esg_history"),
+    "pricing_stock_profiles": ("stock",),
+    "pricing_industry_bars": ("stock", "pricing_history"),
+    "search_stocks": ("stock_search",),
+    "pricing_close_history": ("pricing_history",),
+}
@@ -0,0 +1,184 @@
+# Archive of the raw provider responses of fetch_data.py.
+# The transform only keeps a few fields of every response, so every response fetched from a
+# provider is also appended, as one JSON line, to a gzip file under
+# RAW_ARCHIVE_DIR/landing/endpoint=<endpoint>/date=<fetch date (UTC)>/. compact() rewrites the
+# landing files of every finished day into one Parquet file per endpoint and day (zstd, one row
+# per distinct response) under RAW_ARCHIVE_DIR/compacted/. With PROVIDER_CACHE_MODE=archive (see
+# utils/http_cache.py) every provider call is served from the latest archived response for its
+# parameters, so a new column is backfilled by running fetch_data.py again, without API calls.
+#
+# Usage (from the dashboard directory):
+#   python -m utils.raw_archive compact
+#   python -m utils.raw_archive import-cache   # archive the responses already in the provider cache
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+RAW_ARCHIVE_DIR = os.getenv(
+    "RAW_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "raw", "archive"),
+)
+
+ARCHIVE_COLUMNS = ['record_id', 'endpoint', 'params', 'fetched_at', 'response']
+
+# Appends of the threads of this process, each process writes files of its own
+_append_lock = threading.Lock()
+# Latest archived responses of every archive directory, read once per process by lookup()
+_latest_responses = {}
+
+# Parameters as sorted JSON, the same text for every equal parameter set
+def canonical_params(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+def _partition_dir(archive_dir, stage, endpoint, day):
+    return os.path.join(archive_dir, stage, f"endpoint={endpoint}", f"date={day}")
+
+# Appends a raw response to the landing files of its endpoint and fetch day. Records get an id
+# from their endpoint, parameters and response body (not the fetch time), so the same response
+# fetched again is one record, kept with its latest fetch time (see _dedupe)
+def append_response(endpoint, params, response, fetched_at=None, archive_dir=None):
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    params = canonical_params(params)
+    response = json.dumps(response, sort_keys=True, default=str)
+    record = {
+        'record_id': hashlib.sha1(f"{endpoint}\n{params}\n{response}".encode()).hexdigest(),
+        'endpoint': endpoint,
+        'params': params,
+        'fetched_at': fetched_at,
+        'response': response,
+    }
+    day = datetime.fromtimestamp(fetched_at, timezone.utc).strftime('%Y-%m-%d')
+    partition = _partition_dir(archive_dir or RAW_ARCHIVE_DIR, "landing", endpoint, day)
+    os.makedirs(partition, exist_ok=True)
+    with _append_lock, gzip.open(os.path.join(partition, f"part-{os.getpid()}.jsonl.gz"), "at", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+# Records of a landing file. A process that died while appending leaves an incomplete last
+# gzip member, whose complete lines are kept
+def read_landing_file(path):
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    records.append(json.loads(line))
+    except (EOFError, gzip.BadGzipFile):
+        print(f"Skipping the incomplete end of {path}")
+    return records
+
+def _records_frame(records):
+    df = pd.DataFrame.from_records(records, columns=ARCHIVE_COLUMNS)
+    df['fetched_at'] = pd.to_datetime(df['fetched_at'].astype('float64'), unit='s', utc=True)
+    return df
+
+# One row per record id, the one fetched last, ordered by fetch time
+def _dedupe(df):
+    df = df.sort_values('fetched_at', kind='stable')
+    return df.drop_duplicates('record_id', keep='last').reset_index(drop=True)
+
+# Landing partitions as (endpoint, day, directory)
+def _landing_partitions(archive_dir):
+    partitions = []
+    for directory in sorted(glob.glob(os.path.join(archive_dir, "landing", "endpoint=*", "date=*"))):
+        endpoint = os.path.basename(os.path.dirname(directory))[len("endpoint="):]
+        partitions.append((endpoint, os.path.basename(directory)[len("date="):], directory))
+    return partitions
+
+def _compacted_path(archive_dir, endpoint, day):
+    return os.path.join(archive_dir, "compacted", f"endpoint={endpoint}", f"date={day}.parquet")
+
+# Rewrites the landing files of every day before `until` (YYYY-MM-DD, default today in UTC, whose
+# files may still be appended to) into the day's Parquet file, merged with what was compacted
+# before. Records of the same response are merged (_dedupe). The landing files are removed once
+# the Parquet file is in place; when that is interrupted, the next compaction merges the
+# duplicate records. Returns the rows per partition
+def compact(archive_dir=None, until=None):
+    archive_dir = archive_dir or RAW_ARCHIVE_DIR
+    until = until or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    compacted = {}
+    for endpoint, day, directory in _landing_partitions(archive_dir):
+        if day >= until:
+            continue
+        files = sorted(glob.glob(os.path.join(directory, "*.jsonl.gz")))
+        df = _records_frame([record for path in files for record in read_landing_file(path)])
+        target = _compacted_path(archive_dir, endpoint, day)
+        if os.path.exists(target):
+            df = pd.concat([pd.read_parquet(target), df], ignore_index=True)
+        df = _dedupe(df)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, compression='zstd', index=False)
+        os.replace(tmp_path, target)
+        for path in files:
+            os.remove(path)
+        if not os.listdir(directory):
+            os.rmdir(directory)
+        compacted[f"{endpoint}/{day}"] = len(df)
+    return compacted
+
+# Every archived response (compacted and still landing), optionally of one endpoint only, with
+# the params and response as JSON text
+def read_archive(endpoint=None, archive_dir=None):
+    archive_dir = archive_dir or RAW_ARCHIVE_DIR
+    pattern = f"endpoint={endpoint}" if endpoint else "endpoint=*"
+    frames = [pd.read_parquet(path) for path in sorted(glob.glob(os.path.join(archive_dir, "compacted", pattern, "date=*.parquet")))]
+    landing = sorted(glob.glob(os.path.join(archive_dir, "landing", pattern, "date=*", "*.jsonl.gz")))
+    frames.append(_records_frame([record for path in landing for record in read_landing_file(path)]))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return _records_frame([])
+    return _dedupe(pd.concat(frames, ignore_index=True))
+
+# Latest response per (endpoint, params) of the archive, as JSON text
+def latest_responses(archive_dir=None):
+    df = read_archive(archive_dir=archive_dir).sort_values('fetched_at', kind='stable')
+    latest = df.drop_duplicates(['endpoint', 'params'], keep='last')
+    return dict(zip(zip(latest['endpoint'], latest['params']), latest['response']))
+
+# Latest archived response for the endpoint and parameters
+def lookup(endpoint, params, archive_dir=None):
+    archive_dir = archive_dir or RAW_ARCHIVE_DIR
+    if archive_dir not in _latest_responses:
+        _latest_responses[archive_dir] = latest_responses(archive_dir)
+    response = _latest_responses[archive_dir].get((endpoint, canonical_params(params)))
+    if response is None:
+        raise LookupError(f"No archived response for {endpoint} {params} in {archive_dir}")
+    return json.loads(response)
+
+# Archives the responses stored by utils/http_cache.py (with the time they were recorded)
+def import_provider_cache(cache_dir, archive_dir=None):
+    imported = 0
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*", "*.json"))):
+        with open(path) as f:
+            entry = json.load(f)
+        append_response(entry["endpoint"], entry["params"], entry["response"], entry["recorded_at"], archive_dir)
+        imported += 1
+    return imported
+
+def main():
+    from utils.http_cache import PROVIDER_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description='Compact the raw provider response archive')
+    parser.add_argument('command', choices=['compact', 'import-cache'])
+    parser.add_argument('--archive-dir', default=RAW_ARCHIVE_DIR)
+    parser.add_argument('--cache-dir', default=PROVIDER_CACHE_DIR, help='Provider cache to import (import-cache)')
+    args = parser.parse_args()
+
+    if args.command == 'import-cache':
+        print(f"Archived {import_provider_cache(args.cache_dir, args.archive_dir)} responses of {args.cache_dir}")
+    compacted = compact(args.archive_dir)
+    for partition, rows in compacted.items():
+        print(f"Compacted {partition}: {rows} responses")
+    print(f"Compacted {len(compacted)} partitions in {args.archive_dir}")
+
+if __name__ == '__main__':
+    main()
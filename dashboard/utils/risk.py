@@ -0,0 +1,169 @@
+# Risk metrics of every ticker, computed array-at-a-time over the aligned date x ticker
+# matrix of daily log returns (see analytics.build_price_matrix). Every metric is a NumPy
+# reduction along the date axis, so each ticker is one column and no Python loop runs per
+# ticker. Large universes are split into column blocks over a process pool.
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import ANNUAL_RISK_FREE_RATE, TRADING_DAYS
+
+# Confidence level of the historical Value at Risk and Conditional Value at Risk
+VAR_CONFIDENCE = 0.95
+# Window of the rolling metrics, about one quarter of trading days
+ROLLING_WINDOW = 63
+# Below this many tickers starting the pool and pickling the blocks costs more than it saves
+PARALLEL_MIN_TICKERS = int(os.getenv("DASHBOARD_RISK_PARALLEL_MIN_TICKERS", 1000))
+RISK_WORKERS = int(os.getenv("DASHBOARD_RISK_WORKERS", os.cpu_count() or 1))
+
+RISK_METRICS = [
+    'annualized_mean_return', 'annualized_std_return', 'sharpe_ratio', 'sortino_ratio',
+    'max_drawdown', 'beta', 'value_at_risk', 'conditional_value_at_risk',
+]
+
+# Daily log returns of every column of a price matrix (the first row is NaN)
+def log_return_matrix(prices):
+    return np.diff(np.log(prices), axis=0, prepend=np.nan)
+
+# Index group of every ticker: its industry when industries (a Series indexed by ticker) are
+# given, otherwise a single group for the equal-weight market index
+def index_group_codes(tickers, industries=None):
+    if industries is None:
+        return np.zeros(len(tickers), dtype=np.intp)
+    return pd.factorize(industries.reindex(tickers), use_na_sentinel=False)[0]
+
+# Daily log returns of the equal-weight index of every group, as a date x group matrix.
+# Each index return is the average simple return of the group's tickers trading that day
+def index_returns(returns, group_codes):
+    simple = np.expm1(returns)
+    valid = np.isfinite(simple)
+    one_hot = np.eye(group_codes.max() + 1)[group_codes]
+    sums = np.where(valid, simple, 0.0) @ one_hot
+    counts = valid @ one_hot
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.log1p(sums / counts)
+
+# Log returns, index returns and index group of every ticker of a price matrix
+def risk_inputs(price_matrix, industries=None):
+    returns = log_return_matrix(price_matrix.to_numpy(dtype=np.float64))
+    group_codes = index_group_codes(price_matrix.columns.astype(str), industries)
+    return returns, index_returns(returns, group_codes), group_codes
+
+# Linearly interpolated quantile of every column, like np.nanquantile but from one sort of
+# the whole block instead of a partition per column (NaNs sort to the end of each column)
+def _column_quantile(values, counts, q):
+    sorted_values = np.sort(values, axis=0)
+    position = np.maximum(counts - 1, 0) * q
+    lower = np.floor(position).astype(np.intp)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    low = np.take_along_axis(sorted_values, lower[None, :], axis=0)[0]
+    high = np.take_along_axis(sorted_values, upper[None, :], axis=0)[0]
+    return np.where(counts > 0, low + (high - low) * (position - lower), np.nan)
+
+# Full metric set of a block of return columns against the matching index return columns
+def _risk_metrics(returns, benchmark, annual_risk_free_rate, confidence):
+    valid = np.isfinite(returns)
+    daily_risk_free_rate = annual_risk_free_rate / TRADING_DAYS
+    # Tickers with too little history end up with NaN metrics, which is what the pages expect
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        annualized_mean_return = np.nanmean(returns, axis=0) * TRADING_DAYS
+        annualized_std_return = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+        excess_return = annualized_mean_return - annual_risk_free_rate
+
+        # Downside deviation only counts the days below the risk-free rate
+        downside = np.minimum(returns - daily_risk_free_rate, 0.0)
+        downside_deviation = np.sqrt(np.nanmean(downside ** 2, axis=0)) * np.sqrt(TRADING_DAYS)
+
+        # Drawdown on the cumulative log return path, missing days count as flat
+        cumulative = np.nancumsum(returns, axis=0)
+        max_drawdown = np.expm1(np.min(cumulative - np.maximum.accumulate(cumulative, axis=0), axis=0)) * 100
+
+        # Beta over the days both the ticker and its index have a return
+        both = valid & np.isfinite(benchmark)
+        ticker_returns = np.where(both, returns, np.nan)
+        benchmark_returns = np.where(both, benchmark, np.nan)
+        covariance = np.nanmean(
+            (ticker_returns - np.nanmean(ticker_returns, axis=0)) * (benchmark_returns - np.nanmean(benchmark_returns, axis=0)), axis=0
+        )
+        beta = covariance / np.nanvar(benchmark_returns, axis=0)
+
+        # Historical VaR and CVaR, as positive daily loss percentages
+        var_threshold = _column_quantile(returns, valid.sum(axis=0), 1 - confidence)
+        tail_mean = np.nanmean(np.where(returns <= var_threshold, returns, np.nan), axis=0)
+
+    return {
+        'annualized_mean_return': annualized_mean_return,
+        'annualized_std_return': annualized_std_return,
+        'sharpe_ratio': excess_return / annualized_std_return,
+        'sortino_ratio': excess_return / downside_deviation,
+        'max_drawdown': max_drawdown,
+        'beta': beta,
+        'value_at_risk': -np.expm1(var_threshold) * 100,
+        'conditional_value_at_risk': -np.expm1(tail_mean) * 100,
+    }
+
+# Sharpe, Sortino, max drawdown (%), beta, VaR and CVaR (daily loss %) of every ticker of a
+# price matrix. Beta is measured against the equal-weight market index, or against the
+# equal-weight index of the ticker's industry when industries are given
+def calculate_risk_metrics(price_matrix, industries=None, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE,
+                           confidence=VAR_CONFIDENCE, workers=None):
+    returns, index, group_codes = risk_inputs(price_matrix, industries)
+    benchmark = index[:, group_codes]
+    workers = RISK_WORKERS if workers is None else workers
+
+    n_tickers = returns.shape[1]
+    if workers > 1 and n_tickers >= PARALLEL_MIN_TICKERS:
+        bounds = np.linspace(0, n_tickers, workers + 1).astype(int)
+        blocks = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        # Spawned workers, as the pool may be started from the dashboard's cache warmer thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(
+                _risk_metrics,
+                [returns[:, block] for block in blocks],
+                [benchmark[:, block] for block in blocks],
+                repeat(annual_risk_free_rate),
+                repeat(confidence),
+            ))
+        metrics = {name: np.concatenate([part[name] for part in parts]) for name in RISK_METRICS}
+    else:
+        metrics = _risk_metrics(returns, benchmark, annual_risk_free_rate, confidence)
+
+    return pd.DataFrame(metrics, index=pd.Index(price_matrix.columns.astype(str), name='ticker_symbol')).reset_index()
+
+# Rolling annualized volatility, Sharpe ratio and beta over `window` days, computed from
+# running sums so the cost doesn't grow with the window. Returns date x ticker arrays
+def rolling_risk_metrics(returns, benchmark, window=ROLLING_WINDOW, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE):
+    benchmark = np.broadcast_to(benchmark, returns.shape)
+    both = np.isfinite(returns) & np.isfinite(benchmark)
+    ticker_returns = np.where(both, returns, 0.0)
+    benchmark_returns = np.where(both, benchmark, 0.0)
+
+    def rolling_sum(values):
+        sums = np.cumsum(values, axis=0)
+        windowed = sums.copy()
+        windowed[window:] -= sums[:-window]
+        return windowed
+
+    count = rolling_sum(both.astype(np.float64))
+    sum_r, sum_b = rolling_sum(ticker_returns), rolling_sum(benchmark_returns)
+    sum_rr, sum_bb, sum_rb = rolling_sum(ticker_returns ** 2), rolling_sum(benchmark_returns ** 2), rolling_sum(ticker_returns * benchmark_returns)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Windows with less than half of their days traded are left empty
+        count = np.where(count >= max(2, window // 2), count, np.nan)
+        variance_r = np.maximum(sum_rr - sum_r ** 2 / count, 0.0) / (count - 1)
+        variance_b = np.maximum(sum_bb - sum_b ** 2 / count, 0.0) / (count - 1)
+        covariance = (sum_rb - sum_r * sum_b / count) / (count - 1)
+        volatility = np.sqrt(variance_r) * np.sqrt(TRADING_DAYS)
+        return {
+            'volatility': volatility,
+            'sharpe_ratio': (sum_r / count * TRADING_DAYS - annual_risk_free_rate) / volatility,
+            'beta': covariance / variance_b,
+        }
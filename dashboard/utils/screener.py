@@ -0,0 +1,79 @@
+# In-memory stock screener over the per-ticker feature table.
+# Every numeric feature gets a sorted index (sorted values + row order), so a range filter is
+# two binary searches, and every categorical feature gets a bitmap index (one boolean array
+# per value), so a set filter is an OR of precomputed bitmaps. Filters are combined as
+# boolean masks, and top-N sorts walk the sorted index of the sort column, followed by the rows
+# where it is missing (like pandas' na_position='last'), so every match can be returned.
+import numpy as np
+import pandas as pd
+
+NUMERIC_FEATURES = [
+    'total_score', 'environment_score', 'social_score', 'governance_score',
+    'market_cap', 'sharpe_ratio', 'total_return_percentage', 'annualized_mean_return', 'annualized_std_return',
+]
+CATEGORICAL_FEATURES = ['industry', 'country']
+
+class StockScreener:
+    def __init__(self, features):
+        self.features = features.reset_index(drop=True)
+        self.size = len(self.features)
+
+        # Sorted index: (sorted values without NaN, row positions in that order), and the rows
+        # where the value is NaN
+        self.sorted_indexes = {}
+        self.missing_rows = {}
+        for column in NUMERIC_FEATURES:
+            values = self.features[column].to_numpy(dtype=np.float64)
+            order = np.argsort(values, kind='stable')
+            missing = np.isnan(values[order])
+            self.sorted_indexes[column] = (values[order][~missing], order[~missing])
+            self.missing_rows[column] = order[missing]
+
+        # Bitmap index: value -> boolean array over the rows
+        self.bitmaps = {}
+        for column in CATEGORICAL_FEATURES:
+            codes, uniques = pd.factorize(self.features[column])
+            self.bitmaps[column] = {value: codes == code for code, value in enumerate(uniques)}
+
+    # Rows with lower <= column <= upper
+    def range_mask(self, column, lower=None, upper=None):
+        sorted_values, order = self.sorted_indexes[column]
+        start = 0 if lower is None else np.searchsorted(sorted_values, lower, side='left')
+        stop = len(sorted_values) if upper is None else np.searchsorted(sorted_values, upper, side='right')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[start:stop]] = True
+        return mask
+
+    # Rows whose column is one of `values`
+    def set_mask(self, column, values):
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            bitmap = self.bitmaps[column].get(value)
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    # Combines range filters ({column: (lower, upper)}) and set filters ({column: values})
+    def filter(self, ranges=None, sets=None):
+        mask = np.ones(self.size, dtype=bool)
+        for column, (lower, upper) in (ranges or {}).items():
+            mask &= self.range_mask(column, lower, upper)
+        for column, values in (sets or {}).items():
+            mask &= self.set_mask(column, values)
+        return mask
+
+    # The first `n` rows of `mask` ordered by `sort_by`, the ones without a `sort_by` value last
+    def top(self, mask, sort_by, n=50, ascending=False):
+        _, order = self.sorted_indexes[sort_by]
+        if not ascending:
+            order = order[::-1]
+        selected = order[mask[order]][:n]
+        if len(selected) < n:
+            missing = self.missing_rows[sort_by]
+            selected = np.concatenate([selected, missing[mask[missing]][:n - len(selected)]])
+        return self.features.iloc[selected]
+
+    # Range filters, set filters and top-N sort in one call. Returns (top rows, number of matches)
+    def screen(self, ranges=None, sets=None, sort_by='total_score', n=50, ascending=False):
+        mask = self.filter(ranges, sets)
+        return self.top(mask, sort_by, n, ascending), int(mask.sum())
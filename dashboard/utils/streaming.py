@@ -0,0 +1,99 @@
+# Streaming reads of large query results.
+# pd.read_sql_query materializes a whole (all TEXT) join result before anything is converted.
+# stream_query reads through a server-side cursor instead, in chunks of STREAM_CHUNK_ROWS rows,
+# and the functions below type or aggregate every chunk before the next one is fetched, so no
+# more than one chunk of raw rows is in memory at a time. Aggregations keep small per-chunk
+# partial results and combine them at the end.
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from utils.analytics import annualize_company_stats, ANNUAL_RISK_FREE_RATE, build_price_matrix, calculate_daily_industry_margins
+from utils.frames import build_typed_frame
+
+STREAM_CHUNK_ROWS = int(os.getenv("DASHBOARD_STREAM_CHUNK_ROWS", "100000"))
+
+# Yields the result of `sql` in frames of `chunksize` rows, fetched with a server-side cursor
+def stream_query(sql, engine, params=None, chunksize=None):
+    chunksize = chunksize or STREAM_CHUNK_ROWS
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+        yield from pd.read_sql_query(sql, conn, params=params, chunksize=chunksize)
+
+# Concatenates typed frames, with the categories of every categorical column merged
+def concat_typed_frames(frames):
+    for column, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = union_categoricals([frame[column] for frame in frames], sort_categories=True).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+# Typed frame of a streamed result (see utils/frames.py), converted chunk by chunk.
+# `columns` keeps only these columns of every chunk
+def read_typed_chunks(chunks, schema, columns=None):
+    return concat_typed_frames([build_typed_frame(chunk if columns is None else chunk[columns], schema) for chunk in chunks])
+
+# Date x ticker closing prices (see analytics.build_price_matrix) of streamed ticker_symbol, date, close rows
+def stream_price_matrix(chunks):
+    return build_price_matrix(read_typed_chunks(chunks, "close_history", ['ticker_symbol', 'date', 'close']))
+
+# Sum and count of the daily margins per industry and date (see
+# analytics.calculate_daily_industry_margins) of streamed daily bars
+def stream_daily_industry_margins(chunks):
+    partials = pd.concat([calculate_daily_industry_margins(chunk) for chunk in chunks], ignore_index=True)
+    return partials.groupby(['industry', 'date'])[['sum', 'count']].sum().reset_index()
+
+# Count, mean, M2 (sum of squared deviations) and sum of the log returns of every ticker of
+# one chunk, and the sum and count of its ESG scores. `previous` is the (ticker, close) of the
+# last row of the previous chunk, as a ticker's rows may continue in the next chunk
+def _log_return_partials(chunk, previous):
+    tickers = chunk['ticker_symbol'].astype(str).to_numpy(dtype=object)
+    close = pd.to_numeric(chunk['close'], errors='coerce').to_numpy(dtype=np.float64)
+    previous_tickers = np.concatenate([[previous[0]], tickers[:-1]])
+    previous_close = np.concatenate([[previous[1]], close[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_returns = np.where(tickers == previous_tickers, np.log(close / previous_close), np.nan)
+
+    rows = pd.DataFrame({
+        'ticker_symbol': tickers,
+        'log_return': log_returns,
+        'total_esg_score': pd.to_numeric(chunk['total_esg_score'], errors='coerce').to_numpy(dtype=np.float64),
+    })
+    grouped = rows.groupby('ticker_symbol', sort=False)
+    partial = grouped['log_return'].agg(['count', 'mean', 'sum'])
+    partial['m2'] = grouped['log_return'].var(ddof=0).fillna(0.0) * partial['count']
+    partial['esg_sum'] = grouped['total_esg_score'].sum()
+    partial['esg_count'] = grouped['total_esg_score'].count()
+    return partial, (tickers[-1], close[-1])
+
+# Annualized return, volatility and Sharpe ratio of every company (like
+# analytics.calculate_sharpe_ratios) from streamed esg_risk rows ordered by ticker and date.
+# The per-chunk statistics are merged with the parallel variance formula
+def stream_sharpe_ratios(chunks, annual_risk_free_rate=ANNUAL_RISK_FREE_RATE):
+    partials, previous = [], (None, np.nan)
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        partial, previous = _log_return_partials(chunk, previous)
+        partials.append(partial)
+    if not partials:
+        return annualize_company_stats(pd.DataFrame(
+            columns=['ticker_symbol', 'mean_log_return', 'std_log_return', 'sum_log_return', 'total_esg_score'], dtype=np.float64
+        ), annual_risk_free_rate)
+
+    partials = pd.concat(partials)
+    grouped = partials.groupby(level=0)
+    count = grouped['count'].sum()
+    log_return_sum = grouped['sum'].sum()
+    mean = log_return_sum / count.where(count > 0)
+    deviation = (partials['mean'] - mean.reindex(partials.index)) ** 2 * partials['count']
+    m2 = grouped['m2'].sum() + deviation.fillna(0.0).groupby(level=0).sum()
+
+    company_stats = pd.DataFrame({
+        'mean_log_return': mean,
+        'std_log_return': np.sqrt(m2 / (count - 1).where(count > 1)),
+        'sum_log_return': log_return_sum,
+        'total_esg_score': grouped['esg_sum'].sum() / grouped['esg_count'].sum().where(lambda esg_count: esg_count > 0),
+    }).rename_axis('ticker_symbol').reset_index()
+    return annualize_company_stats(company_stats, annual_risk_free_rate)
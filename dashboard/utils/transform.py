@@ -0,0 +1,131 @@
+# Transform layer of fetch_data.py.
+# The raw provider responses of all tickers are collected first and turned into one typed
+# frame per table in bulk: records become columns in a single DataFrame construction, dates
+# are parsed with one vectorized call, every frame is validated against its table schema and
+# duplicate (ticker, date) rows are dropped.
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# Date formats of the providers
+PRICING_DATE_FORMAT = '%Y-%m-%d'
+ESG_DATE_FORMAT = '%d-%m-%Y'
+
+# Column types of the transformed tables, in CSV column order, and the key of every table
+TABLE_SCHEMAS = {
+    'stock': {
+        'columns': {
+            'ticker_symbol': 'string',
+            'name': 'string',
+            'industry': 'string',
+            'market_cap': 'float64',
+            'country': 'string',
+            'description': 'string',
+            'logo': 'string',
+            'updated_at': 'datetime64[ns]',
+        },
+        'key': ['ticker_symbol'],
+    },
+    'pricing_history': {
+        'columns': {
+            'ticker_symbol': 'string',
+            'date': 'datetime64[ns]',
+            'open': 'float64',
+            'high': 'float64',
+            'low': 'float64',
+            'close': 'float64',
+        },
+        'key': ['ticker_symbol', 'date'],
+    },
+    'esg_history': {
+        'columns': {
+            'ticker_symbol': 'string',
+            'date': 'datetime64[ns]',
+            'total_score': 'Int64',
+            'environment_score': 'Int64',
+            'social_score': 'Int64',
+            'governance_score': 'Int64',
+        },
+        'key': ['ticker_symbol', 'date'],
+    },
+}
+
+# Parses a column of dates in `date_format`. Dates that don't match the format become missing
+# values. Dates without a time are written to the csv files as YYYY-MM-DD
+def normalize_dates(dates, date_format):
+    return pd.to_datetime(dates, format=date_format, errors='coerce')
+
+# Checks that a frame has every column of its table and casts them to the table's types.
+# Numbers that can't be parsed become missing, rows with a missing key are dropped and only
+# the last row of every key is kept
+def validate_frame(df, table):
+    schema = TABLE_SCHEMAS[table]
+    missing = [column for column in schema['columns'] if column not in df.columns]
+    if missing:
+        raise ValueError(f"{table} is missing the columns: {', '.join(missing)}")
+
+    df = df[list(schema['columns'])].copy()
+    for column, dtype in schema['columns'].items():
+        if dtype in ('float64', 'Int64'):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+            df[column] = (df[column].round() if dtype == 'Int64' else df[column]).astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+
+    invalid_rows = df[schema['key']].isna().any(axis=1)
+    if invalid_rows.any():
+        print(f"Dropping {invalid_rows.sum()} {table} rows with a missing {' or '.join(schema['key'])}")
+    df = df[~invalid_rows]
+    duplicates = df.duplicated(subset=schema['key'], keep='last')
+    if duplicates.any():
+        print(f"Dropping {duplicates.sum()} duplicate {table} rows")
+    return df[~duplicates].reset_index(drop=True)
+
+# Stock table from the Finnhub company profiles and the FMP profiles (lists with one profile)
+# of the tickers, in the same order
+def build_stock_frame(ticker_symbols, finnhub_profiles, fmp_profiles):
+    finnhub = pd.DataFrame.from_records(finnhub_profiles)
+    fmp = pd.DataFrame.from_records([profile[0] if profile else {} for profile in fmp_profiles], columns=['description'])
+    df = pd.DataFrame({
+        'ticker_symbol': ticker_symbols,
+        'name': finnhub.get('name'),
+        'industry': finnhub.get('finnhubIndustry'),
+        'market_cap': finnhub.get('marketCapitalization'),
+        'country': finnhub.get('country'),
+        'description': fmp['description'],
+        'logo': finnhub.get('logo'),
+        # Market cap data changes, so added current date to keep track of this
+        'updated_at': pd.Timestamp.now(),
+    })
+    return validate_frame(df, 'stock')
+
+# Values of `column` of every record as float64. Numbers are read straight into the array, other
+# values (missing keys, None, strings) go through pd.to_numeric, and what isn't a number becomes NaN
+def numeric_column(records, column):
+    try:
+        return np.fromiter(map(itemgetter(column), records), dtype=np.float64, count=len(records))
+    except (KeyError, TypeError, ValueError):
+        values = pd.Series([record.get(column) for record in records], dtype=object)
+        return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+
+# Pricing history table from the FMP daily price lists of every ticker ({ticker: [daily price, ...]}).
+# Every column is built directly from the records, without an intermediate object frame
+def build_pricing_frame(price_histories):
+    lengths = [len(history) for history in price_histories.values()]
+    records = [daily_price for history in price_histories.values() for daily_price in history]
+    df = pd.DataFrame({
+        'ticker_symbol': np.repeat(list(price_histories), lengths),
+        'date': normalize_dates([daily_price.get('date') for daily_price in records], PRICING_DATE_FORMAT),
+        **{column: numeric_column(records, column) for column in ('open', 'high', 'low', 'close')},
+    })
+    return validate_frame(df, 'pricing_history')
+
+# ESG history table of the tickers, from the raw ESG ratings csv (the first rating of every ticker)
+def build_esg_frame(ticker_symbols, esg_dataframe):
+    df = esg_dataframe.assign(ticker_symbol=esg_dataframe['ticker'].str.upper())
+    df = df[df['ticker_symbol'].isin(ticker_symbols)].drop_duplicates(subset='ticker_symbol', keep='first')
+    df['date'] = normalize_dates(df['last_processing_date'], ESG_DATE_FORMAT)
+    # Keep the order of the ticker list
+    df = df.set_index('ticker_symbol').reindex(pd.Index(ticker_symbols, name='ticker_symbol')).reset_index()
+    return validate_frame(df, 'esg_history')
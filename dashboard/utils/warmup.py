@@ -0,0 +1,142 @@
+# Cache warm-up and live refresh of the dashboard data.
+# A single warmer thread per server process pre-executes every named query and derived frame
+# (for the default selections and every industry) when the app starts. It then keeps one
+# connection listening on the channel data/loader.py notifies after every load, with the
+# reloaded tables and their new load version. Only the cached data reading those tables gets a
+# new cache key and is warmed again, without polling the database. Every
+# DASHBOARD_REFRESH_INTERVAL seconds the warmer also catches up with the data_loads table (in
+# case a notification was missed) and warms every key again, which only re-runs the entries
+# evicted since; the keys themselves only change with a load. The versions found at start-up are
+# published to the pages right away, so they do not query data_loads on every call during the
+# first warm-up. Later versions are only published once they are warm, so interactive users
+# never hit a cold cache after a load.
+import json
+import os
+import select
+import threading
+import time
+
+import streamlit as st
+
+from utils import data, queries
+from utils.analytics import MARGIN_FREQUENCIES
+from utils.backtest import DEFAULT_PARAMETERS
+from utils.factors import FACTOR_WINDOWS
+from utils.db import get_engine
+
+# Channel data/loader.py notifies after every load
+DATA_LOADS_CHANNEL = "data_loads"
+# Seconds to wait before reconnecting the listener after an error
+LISTEN_RETRY_INTERVAL = int(os.getenv("DASHBOARD_LISTEN_RETRY_INTERVAL", "30"))
+# Seconds between scheduled refreshes of all cached data
+REFRESH_INTERVAL = int(os.getenv("DASHBOARD_REFRESH_INTERVAL", "3600"))
+
+# Runs every cached query and computation for `versions`, skipping the ones whose tables have
+# the same versions in `previous` (still warm). Returns the seconds spent per warmed item
+def warm_caches(versions, previous=None):
+    timings = {}
+
+    def warm(name, names, fn, *args):
+        key = data.version_key(versions, *names)
+        if previous is not None and key == data.version_key(previous, *names):
+            return
+        start = time.perf_counter()
+        fn(*args, key)
+        timings[name] = time.perf_counter() - start
+
+    for name in queries.NAMED_QUERIES:
+        if name not in data.STREAMED_QUERIES:
+            warm(f"query:{name}", [name], data._load_query, name)
+    warm("market_data", ["esg_market"], data._load_market_data)
+    warm("sharpe_ratios", ["esg_risk"], data._load_sharpe_ratios)
+    for benchmark in ('market', 'industry'):
+        warm(f"risk_metrics:{benchmark}", data.risk_queries(benchmark), data._load_risk_metrics, benchmark)
+    for frequency in MARGIN_FREQUENCIES:
+        warm(f"industry_margins:{frequency}", ["pricing_industry_bars"], data._load_industry_margins, frequency)
+    warm("stock_screener", ["screener_stocks", "esg_risk"], data._load_stock_screener)
+    for window in FACTOR_WINDOWS.values():
+        warm(f"factor_regressions:{window}", data.FACTOR_QUERIES, data._load_factor_regressions, window)
+    warm("return_attribution", data.FACTOR_QUERIES, data._load_return_attribution)
+    warm("backtest", ["esg_score_history", "esg_risk"], data._load_backtest, tuple(sorted(DEFAULT_PARAMETERS.items())))
+    industries = data._load_query("home_kpi_industries", data.version_key(versions, "home_kpi_industries"))['industry'].tolist()
+    for industry in ['All', *industries]:
+        warm(f"esg_kpis:{industry}", ["home_esg_kpis"], data._load_esg_kpis, industry)
+    return timings
+
+# Opens a connection of its own (outside the engine's pool) listening for data loads
+def listen_for_loads():
+    connection = get_engine().raw_connection()
+    listener = connection.driver_connection
+    connection.detach()
+    listener.autocommit = True
+    with listener.cursor() as cursor:
+        cursor.execute(f"LISTEN {DATA_LOADS_CHANNEL};")
+    return listener
+
+# Waits up to `timeout` seconds for notifications. Returns their payloads ({"version", "tables"})
+def wait_for_loads(listener, timeout):
+    if select.select([listener], [], [], timeout) == ([], [], []):
+        return []
+    listener.poll()
+    loads = [json.loads(notify.payload) for notify in listener.notifies]
+    listener.notifies.clear()
+    return loads
+
+class CacheWarmer(threading.Thread):
+    def __init__(self, retry_interval=LISTEN_RETRY_INTERVAL, refresh_interval=REFRESH_INTERVAL):
+        super().__init__(name="cache-warmer", daemon=True)
+        self.retry_interval = retry_interval
+        self.refresh_interval = refresh_interval
+        self.versions = None
+        self.last_timings = {}
+        self.last_error = None
+        self._refreshed_at = 0.0
+
+    # Warms the data of every table whose version changed (of every table with `rewarm`) and
+    # publishes the versions to the pages
+    def refresh(self, versions, rewarm=False):
+        self.last_timings = warm_caches(versions, None if rewarm else self.versions)
+        data.publish_versions(versions)
+        self.versions = versions
+        self._refreshed_at = time.monotonic()
+        print(f"Cache warm-up of {len(self.last_timings)} items for data versions {versions} took {sum(self.last_timings.values()):.1f}s")
+
+    def run(self):
+        listener = None
+        while True:
+            try:
+                if listener is None:
+                    listener = listen_for_loads()
+                    # Loads may have finished while nothing was listening
+                    versions = data.get_loaded_versions()
+                    if self.versions is None:
+                        # Until the first warm-up is done (or if it fails), the pages read these
+                        # versions instead of querying data_loads on every call
+                        data.publish_versions(versions)
+                    self.refresh(versions)
+
+                timeout = max(self.refresh_interval - (time.monotonic() - self._refreshed_at), 0)
+                loads = wait_for_loads(listener, timeout)
+                if loads:
+                    versions = dict(self.versions)
+                    for load in loads:
+                        versions.update(dict.fromkeys(load["tables"], load["version"]))
+                    self.refresh(versions)
+                elif time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                    self.refresh(data.get_loaded_versions(), rewarm=True)
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the last warm versions, and reconnect after a while
+                self.last_error = e
+                print(f"Cache warm-up failed: {e}")
+                if listener is not None:
+                    listener.close()
+                    listener = None
+                time.sleep(self.retry_interval)
+
+# Starts the warmer once per server process
+@st.cache_resource
+def start_cache_warmer():
+    warmer = CacheWarmer()
+    warmer.start()
+    return warmer
@@ -1,9 +1,23 @@
+import io
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
 import time
 
+import validate
+
+# Number of tables, and of chunks of a large table, loaded at the same time
+LOAD_WORKERS = int(os.getenv("LOADER_WORKERS", os.cpu_count() or 4))
+# Tables with more rows are loaded in chunks of this many rows through an unlogged staging table
+CHUNK_ROWS = int(os.getenv("LOADER_CHUNK_ROWS", 100000))
+
+# Channel notified after every load, the dashboard listens on it to refresh its cached data
+DATA_LOADS_CHANNEL = "data_loads"
+
 # PostgreSQL database configuration
 db_config = {
     "dbname": "esg-stocks-database",
@@ -26,19 +40,214 @@ def is_db_ready(engine):
 
 # Function to drop the table if it exists
 def drop_table(table_name, engine):
-    with engine.connect() as conn:
+    with engine.begin() as conn:
         drop_table_query = text(f"DROP TABLE IF EXISTS {table_name} CASCADE;")
         conn.execute(drop_table_query)
 
+# Function to read a CSV file with every column as text, like it is stored in PostgreSQL
+def read_csv(csv_file):
+    return pd.read_csv(csv_file, dtype=str, delimiter=',')
+
+# Function to upload a frame to PostgreSQL
+def upload_frame_to_postgres(df, table_name, engine):
+    df.to_sql(table_name, engine, if_exists='replace', index=False)
+
+# Function to create the pricing_history table, range partitioned by year on its date column.
+# Every other column stays TEXT, like in the tables created by to_sql
+def create_pricing_history_table(columns, engine):
+    column_definitions = ", ".join('"date" DATE NOT NULL' if column == 'date' else f'"{column}" TEXT' for column in columns)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS pricing_history ({column_definitions}) PARTITION BY RANGE (date);"))
+
+# Function to create the yearly partitions of pricing_history that don't exist yet
+def create_pricing_history_partitions(years, engine):
+    with engine.begin() as conn:
+        for year in years:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS pricing_history_{year} PARTITION OF pricing_history "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');"
+            ))
+
+# Function to create the indexes of pricing_history. Indexes of a partitioned table are built
+# on every partition, including the ones added later: a BRIN index on the date for date ranges,
+# and a B-tree on (ticker_symbol, date) for the history of single tickers
+def create_pricing_history_indexes(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS pricing_history_date_brin ON pricing_history USING BRIN (date);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS pricing_history_ticker_date ON pricing_history (ticker_symbol, date);"))
+        conn.execute(text("ANALYZE pricing_history;"))
+
+# Function to append a frame to pricing_history, creating the partitions of its years first
+def upload_pricing_history(df, engine):
+    create_pricing_history_table(df.columns, engine)
+    create_pricing_history_partitions(sorted(pd.to_datetime(df['date']).dt.year.unique()), engine)
+    df.to_sql('pricing_history', engine, if_exists='append', index=False, chunksize=10000)
+    create_pricing_history_indexes(engine)
+
+# Function to copy a frame into an existing table with COPY, on a connection of its own
+def copy_frame(df, table_name, engine):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(f'"{column}"' for column in df.columns)
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        conn.commit()
+    finally:
+        conn.close()
+
+# Function to load a large table: its chunks are copied in parallel into an unlogged staging
+# table (no write-ahead log), which is then merged into the final table in one statement.
+# The chunks go to `copy_pool` when given (shared by all tables being loaded, see load_tables),
+# otherwise to a pool of `workers` threads of its own
+def upload_table_in_chunks(df, table_name, engine, workers=LOAD_WORKERS, copy_pool=None):
+    staging_table = f"{table_name}_staging"
+    columns = ", ".join(f'"{column}"' for column in df.columns)
+    column_definitions = ", ".join(f'"{column}" TEXT' for column in df.columns)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging_table};"))
+        conn.execute(text(f"CREATE UNLOGGED TABLE {staging_table} ({column_definitions});"))
+
+    chunks = [df.iloc[start:start + CHUNK_ROWS] for start in range(0, len(df), CHUNK_ROWS)]
+    with nullcontext(copy_pool) if copy_pool else ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda chunk: copy_frame(chunk, staging_table, engine), chunks))
+
+    if table_name == 'pricing_history':
+        create_pricing_history_table(df.columns, engine)
+        create_pricing_history_partitions(sorted(pd.to_datetime(df['date']).dt.year.unique()), engine)
+        select_list = ", ".join('CAST("date" AS DATE)' if column == 'date' else f'"{column}"' for column in df.columns)
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE TABLE {table_name} (LIKE {staging_table});"))
+        select_list = columns
+
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {table_name} ({columns}) SELECT {select_list} FROM {staging_table};"))
+        conn.execute(text(f"DROP TABLE {staging_table};"))
+    if table_name == 'pricing_history':
+        create_pricing_history_indexes(engine)
+
+# Function to upload a table, pricing_history goes into its partitioned table
+def upload_table(df, table_name, engine, copy_pool=None):
+    if len(df) > CHUNK_ROWS:
+        upload_table_in_chunks(df, table_name, engine, copy_pool=copy_pool)
+    elif table_name == 'pricing_history':
+        upload_pricing_history(df, engine)
+    else:
+        upload_frame_to_postgres(df, table_name, engine)
+
+# Function to (re)load independent tables at the same time. Returns the seconds per table.
+# The chunks of all large tables share one pool of `workers` COPY threads, so a load uses at
+# most 2 x `workers` connections: one per table thread and one per COPY thread
+def load_tables(frames, engine, workers=LOAD_WORKERS):
+    def load(table_name, df):
+        start = time.perf_counter()
+        drop_table(table_name, engine)  # Drop table if it exists
+        upload_table(df, table_name, engine, copy_pool)  # Upload new data
+        print(f"Uploaded data from {table_name}.csv to table {table_name}.")
+        return table_name, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as copy_pool, ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(load, frames, frames.values()))
+
 # Function to upload CSV files to PostgreSQL
 def upload_csv_to_postgres(csv_file, table_name, engine):
-    df = pd.read_csv(csv_file, dtype=str, delimiter=',')
-    df.to_sql(table_name, engine, if_exists='replace', index=False)
+    upload_table(read_csv(csv_file), table_name, engine)
+
+# Headline ESG KPIs shown on the home page. Computed once per data load so the
+# dashboard reads a handful of rows instead of scanning esg_history on every visit.
+# Uses the latest ESG row per ticker (by parsed date, rows without a YYYY-MM-DD date are
+# skipped), and produces one row per pillar for all stocks ('All') plus one row per pillar
+# for every industry. Tickers missing from the stock table count as industry 'Unknown'.
+ESG_KPI_QUERY = """
+CREATE TABLE esg_kpis AS
+SELECT
+    CASE WHEN GROUPING(esg.industry) = 1 THEN 'All' ELSE esg.industry END AS industry,
+    s.pillar,
+    COUNT(*) AS companies,
+    AVG(s.score) AS mean_score,
+    MAX(s.score) AS max_score,
+    percentile_cont(0.25) WITHIN GROUP (ORDER BY s.score) AS p25_score,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY s.score) AS median_score,
+    percentile_cont(0.75) WITHIN GROUP (ORDER BY s.score) AS p75_score,
+    NOW() AS computed_at
+FROM (
+    SELECT DISTINCT ON (h.ticker_symbol)
+        h.ticker_symbol, h.total_score, h.environment_score, h.social_score, h.governance_score,
+        COALESCE(st.industry, 'Unknown') AS industry
+    FROM esg_history AS h
+    LEFT JOIN stock AS st ON st.ticker_symbol = h.ticker_symbol
+    WHERE h.date ~ '^[0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$'
+    ORDER BY h.ticker_symbol, CAST(h.date AS date) DESC
+) AS esg
+CROSS JOIN LATERAL (VALUES
+    ('total', CAST(esg.total_score AS double precision)),
+    ('environment', CAST(esg.environment_score AS double precision)),
+    ('social', CAST(esg.social_score AS double precision)),
+    ('governance', CAST(esg.governance_score AS double precision))
+) AS s(pillar, score)
+GROUP BY GROUPING SETS ((s.pillar), (esg.industry, s.pillar))
+"""
+
+# Function to (re)build the esg_kpis summary table from the loaded tables
+def build_esg_kpis(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS esg_kpis;"))
+        conn.execute(text(ESG_KPI_QUERY))
+        conn.execute(text("CREATE INDEX ON esg_kpis (industry, pillar);"))
+
+# Full-text search document per stock, built at load time. Tickers and names weigh most,
+# then industries, then descriptions. Ranked with ts_rank by the dashboard's company search
+STOCK_SEARCH_QUERY = """
+CREATE TABLE stock_search AS
+SELECT
+    ticker_symbol,
+    name,
+    industry,
+    setweight(to_tsvector('simple', COALESCE(ticker_symbol, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(industry, '')), 'B') ||
+    setweight(to_tsvector('english', COALESCE(description, '')), 'C') AS document
+FROM stock
+"""
+
+# Function to (re)build the stock_search table and its GIN index from the stock table
+def build_stock_search(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS stock_search;"))
+        conn.execute(text(STOCK_SEARCH_QUERY))
+        conn.execute(text("CREATE INDEX ON stock_search USING GIN (document);"))
+
+# Function to record a finished load in the data_loads table and notify the dashboard with the
+# loaded tables and the load version. The dashboard uses the latest version of every table as
+# the key of the cached data reading it, and warms the data of the loaded tables again.
+# The notification is only sent when the transaction commits
+def record_data_load(tables, engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS data_loads (
+            version SERIAL PRIMARY KEY,
+            tables TEXT[] NOT NULL,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """))
+        version = conn.execute(
+            text("INSERT INTO data_loads (tables) VALUES (:tables) RETURNING version"),
+            {"tables": tables},
+        ).scalar()
+        conn.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": DATA_LOADS_CHANNEL, "payload": json.dumps({"version": version, "tables": tables})},
+        )
+        return version
 
 # Main function to upload all CSV files in the local folder
 def main():
     conn_url = f"postgresql://{db_config['user']}:{db_config['password']}@{db_config['host']}:{db_config['port']}/{db_config['dbname']}"
-    engine = create_engine(conn_url)
+    # Every table thread and every COPY thread of load_tables needs a connection of its own
+    engine = create_engine(conn_url, pool_size=LOAD_WORKERS, max_overflow=LOAD_WORKERS)
 
     # Wait for the database to be ready
     while not is_db_ready(engine):
@@ -60,13 +269,39 @@ def main():
         # Get list of CSV files in the current directory
         csv_files = [file for file in os.listdir(transformed_data_path) if file.endswith(".csv")]
 
-        # Drop existing tables and upload new data
-        for csv_file in csv_files:
-            table_name = os.path.splitext(csv_file)[0]  # Use CSV filename as table name
-            drop_table(table_name, engine)  # Drop table if it exists
-            upload_csv_to_postgres(f'{transformed_data_path}/{csv_file}', table_name, engine)  # Upload new data
-            print(f"Uploaded data from {csv_file} to table {table_name}.")
+        # Use CSV filename as table name. The files are parsed at the same time
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+            parsed = pool.map(read_csv, [f'{transformed_data_path}/{csv_file}' for csv_file in csv_files])
+            frames = dict(zip([os.path.splitext(csv_file)[0] for csv_file in csv_files], parsed))
+
+        # Check the data before loading it. Rows failing a check are quarantined instead of loaded
+        frames, quarantined, report = validate.validate_tables(frames)
+        validate.write_quarantine(quarantined, report)
+        print(validate.format_report(report))
+
+        # Drop existing tables and upload new data, all tables at the same time
+        start = time.perf_counter()
+        timings = load_tables(frames, engine)
+        for table_name, seconds in timings.items():
+            print(f"Loaded {table_name} in {seconds:.1f}s")
+        print(f"Loaded {len(timings)} tables in {time.perf_counter() - start:.1f}s wall-clock ({sum(timings.values()):.1f}s summed over the tables)")
+
+        loaded_tables = list(timings)
+
+        # Precompute the home page KPIs once the ESG data is in place
+        if "esg_history.csv" in csv_files:
+            build_esg_kpis(engine)
+            loaded_tables.append("esg_kpis")
+            print("Built esg_kpis summary table.")
+
+        # Build the company search index once the stock data is in place
+        if "stock.csv" in csv_files:
+            build_stock_search(engine)
+            loaded_tables.append("stock_search")
+            print("Built stock_search full-text index.")
 
+        version = record_data_load(loaded_tables, engine)
+        print(f"Recorded data load version {version}.")
 
     except Exception as e:
         print(f"Error: {e}")
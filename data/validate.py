@@ -0,0 +1,161 @@
+# Data-quality checks of the transformed tables, run by loader.py before anything is loaded.
+# Every check is a vectorized mask over a whole table. Rows failing any check are moved to
+# quarantine/<table>.csv together with the names of the failed checks, so only clean rows reach
+# the database, and quarantine/report.json lists the counts per check plus warnings about stale
+# data and tickers missing from a table.
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+QUARANTINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quarantine')
+
+# Tickers whose last price is this many days older than the newest price in the data are stale
+STALE_PRICE_DAYS = 30
+# ESG ratings older than this many days before the newest price are stale
+STALE_ESG_DAYS = 3 * 365
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+ESG_SCORE_COLUMNS = ['total_score', 'environment_score', 'social_score', 'governance_score']
+
+# Parsing a whole column at once is much faster than to_numeric, which is only needed when
+# the column has values that aren't numbers
+def _numeric(series):
+    try:
+        return series.astype('float64')
+    except (TypeError, ValueError):
+        return pd.to_numeric(series, errors='coerce')
+
+def _dates(series):
+    return pd.to_datetime(series, format='%Y-%m-%d', errors='coerce')
+
+def _missing(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+def check_stock(df, tickers=None):
+    market_cap = _numeric(df['market_cap'])
+    return {
+        'missing_ticker': _missing(df['ticker_symbol']),
+        'duplicate_key': df.duplicated(subset='ticker_symbol', keep='last'),
+        'missing_name': _missing(df['name']),
+        'invalid_market_cap': ~(market_cap > 0),
+    }
+
+def check_pricing_history(df, tickers=None):
+    prices = df[PRICE_COLUMNS].apply(_numeric)
+    checks = {
+        'missing_ticker': _missing(df['ticker_symbol']),
+        'invalid_date': _dates(df['date']).isna(),
+        'duplicate_key': df.duplicated(subset=['ticker_symbol', 'date'], keep='last'),
+        'invalid_price': ~(prices > 0).all(axis=1),
+        # The low and high have to enclose the open and close
+        'inconsistent_ohlc': (
+            (prices['low'] > prices[['open', 'close']].min(axis=1)) | (prices['high'] < prices[['open', 'close']].max(axis=1))
+        ),
+    }
+    if tickers is not None:
+        checks['unknown_ticker'] = ~df['ticker_symbol'].isin(tickers)
+    return checks
+
+def check_esg_history(df, tickers=None):
+    scores = df[ESG_SCORE_COLUMNS].apply(_numeric)
+    checks = {
+        'missing_ticker': _missing(df['ticker_symbol']),
+        'invalid_date': _dates(df['date']).isna(),
+        'duplicate_key': df.duplicated(subset=['ticker_symbol', 'date'], keep='last'),
+        'invalid_score': ~(scores >= 0).all(axis=1),
+    }
+    if tickers is not None:
+        checks['unknown_ticker'] = ~df['ticker_symbol'].isin(tickers)
+    return checks
+
+TABLE_CHECKS = {
+    'stock': check_stock,
+    'pricing_history': check_pricing_history,
+    'esg_history': check_esg_history,
+}
+
+# Stale data and stock tickers without prices or ESG ratings, from the clean tables
+def find_warnings(frames):
+    warnings = []
+    pricing, esg, stock = frames.get('pricing_history'), frames.get('esg_history'), frames.get('stock')
+
+    if pricing is not None and not pricing.empty:
+        dates = _dates(pricing['date'])
+        last_dates = dates.groupby(pricing['ticker_symbol']).max()
+        newest = dates.max()
+        stale = last_dates[last_dates < newest - pd.Timedelta(days=STALE_PRICE_DAYS)]
+        if not stale.empty:
+            warnings.append({'check': 'stale_prices', 'table': 'pricing_history', 'count': len(stale), 'tickers': stale.index.tolist()})
+        if esg is not None and not esg.empty:
+            esg_dates = _dates(esg['date']).groupby(esg['ticker_symbol']).max()
+            stale_esg = esg_dates[esg_dates < newest - pd.Timedelta(days=STALE_ESG_DAYS)]
+            if not stale_esg.empty:
+                warnings.append({'check': 'stale_esg', 'table': 'esg_history', 'count': len(stale_esg), 'tickers': stale_esg.index.tolist()})
+
+    if stock is not None:
+        for table, df in (('pricing_history', pricing), ('esg_history', esg)):
+            if df is None:
+                continue
+            missing = stock.loc[~stock['ticker_symbol'].isin(df['ticker_symbol'].unique()), 'ticker_symbol']
+            if not missing.empty:
+                warnings.append({'check': 'missing_tickers', 'table': table, 'count': len(missing), 'tickers': missing.tolist()})
+    return warnings
+
+# Runs the checks of every table ({table name: frame}). Returns the clean frames, the
+# quarantined rows with a 'failed_checks' column, and the report
+def validate_tables(frames):
+    clean, quarantined = {}, {}
+    report = {'validated_at': datetime.now(timezone.utc).isoformat(), 'tables': {}}
+
+    # The stock table goes first, so the other tables can be checked against its tickers
+    tickers = None
+    for table in sorted(frames, key=lambda table: table != 'stock'):
+        df = frames[table]
+        if table not in TABLE_CHECKS:
+            clean[table] = df
+            continue
+
+        checks = TABLE_CHECKS[table](df, tickers)
+        failed = np.logical_or.reduce([mask.to_numpy() for mask in checks.values()])
+        failed_checks = np.full(len(df), '', dtype=object)
+        for name, mask in checks.items():
+            failed_checks = np.where(mask.to_numpy(), failed_checks + (name + ' '), failed_checks)
+
+        clean[table] = df[~failed]
+        quarantined[table] = df[failed].assign(failed_checks=[checks.strip() for checks in failed_checks[failed]])
+        report['tables'][table] = {
+            'rows': len(df),
+            'loaded': int((~failed).sum()),
+            'quarantined': int(failed.sum()),
+            'checks': {name: int(mask.sum()) for name, mask in checks.items()},
+        }
+        if table == 'stock':
+            tickers = clean[table]['ticker_symbol']
+
+    report['warnings'] = find_warnings(clean)
+    return clean, quarantined, report
+
+# Writes the quarantined rows of every table and the report to `directory`
+def write_quarantine(quarantined, report, directory=QUARANTINE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    for table, df in quarantined.items():
+        path = os.path.join(directory, f'{table}.csv')
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        df.to_csv(path, index=False)
+    with open(os.path.join(directory, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+def format_report(report):
+    lines = []
+    for table, stats in report['tables'].items():
+        failed = ', '.join(f"{name}: {count}" for name, count in stats['checks'].items() if count)
+        lines.append(f"{table}: {stats['loaded']} of {stats['rows']} rows loaded, {stats['quarantined']} quarantined" + (f" ({failed})" if failed else ''))
+    for warning in report['warnings']:
+        lines.append(f"Warning: {warning['count']} {warning['check'].replace('_', ' ')} in {warning['table']}")
+    return '\n'.join(lines)